@@ -67,6 +67,13 @@ class QueryBuilder:
         self.query += f" WHERE {condition}"
         return self
 
+    def where_in(self, column, values):
+        values = list(values)
+        placeholders = ', '.join(['?' if self.db_type == 'sqlite' else '%s' for _ in values])
+        self.query += f" WHERE {column} IN ({placeholders})"
+        self.params.extend(values)
+        return self
+
     def insert(self, table, columns):
         columns_str = ', '.join(columns)
         placeholders = ', '.join(['?' if self.db_type == 'sqlite' else '%s' for _ in columns])
@@ -112,6 +119,25 @@ class DroneMapper:
             return drone
         return None
 
+    def find_by_ids(self, drone_ids, chunk_size=999):
+        # Один запрос WHERE id IN (...) на порцию id (999 - лимит параметров старых версий SQLite)
+        drone_ids = list(dict.fromkeys(drone_ids))
+        found = {}
+        for start in range(0, len(drone_ids), chunk_size):
+            query_builder = self.factory.create_query_builder()
+            query = query_builder.select("drones", ["id", "manufacturer", "model", "battery_capacity"]) \
+                .where_in("id", drone_ids[start:start + chunk_size]) \
+                .get_query()
+            cursor = self.factory.execute_query(self.connection, query, query_builder.get_params())
+            for result in cursor.fetchall():
+                found[result["id"]] = Drone(result["id"], result["manufacturer"], result["model"],
+                                            result["battery_capacity"])
+            cursor.close()
+        missing = [drone_id for drone_id in drone_ids if drone_id not in found]
+        if missing:
+            logger.info(f"{len(missing)} drone(s) not found: {missing}")
+        return found
+
     def insert_drone(self, drone):
         # Проверка на существование записи
         query_builder = self.factory.create_query_builder()
@@ -189,12 +215,8 @@ def main():
     for drone in drones:
         drone_mapper.insert_drone(drone)
 
-    for drone_id in range(1, 100):
-        found_drone = drone_mapper.find_by_id(drone_id)
-        if found_drone:
-            logger.info(f"Found drone: {found_drone}")
-        else:
-            logger.info(f"Drone with ID {drone_id} not found.")
+    for found_drone in drone_mapper.find_by_ids(range(1, 100)).values():
+        logger.info(f"Found drone: {found_drone}")
 
 
 if __name__ == "__main__":
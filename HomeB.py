@@ -1,33 +1,170 @@
 import abc
+import array
+import base64
+import bisect
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import itertools
+import json
+import queue
+import random
+import re
 import sqlite3
+import sys
 import logging
+import logging.handlers
+import math
+import threading
+import time
 import mysql.connector
 import psycopg2
+import psycopg2.extras
+
+from sqlite_profiles import SQLITE_PROFILES, apply_profile
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_factory_numbers = itertools.count(1)
+
+# Запросы, которые PostgreSQL позволяет подготовить через PREPARE
+PREPARABLE_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+# Составных ключей в одном where_in_rows: SQLite разбирает цепочку OR как дерево,
+# глубина которого ограничена 1000
+ROW_KEYS_PER_QUERY = 300
+
 
 # Абстрактная фабрика
 class AbstractFactory(abc.ABC):
+    def __init__(self, pool_size=5, idle_timeout=300.0, pool_timeout=30.0, ping_after=30.0):
+        # Соединения берутся из пула, а не создаются заново на каждый вызов
+        self.pool = ConnectionPool(self, max_size=pool_size, idle_timeout=idle_timeout, timeout=pool_timeout,
+                                   ping_after=ping_after)
+        self._local = threading.local()  # Текущая единица работы у каждого потока своя
+        # Пространство имен фабрики в общем кэше дронов и счетчик записей через мапперы:
+        # отрицательные записи кэша, сделанные до последней записи, считаются устаревшими
+        self.cache_namespace = next(_factory_numbers)
+        self.write_generation = 0
+        self.hooks = []  # Список заменяется целиком, поэтому читается без блокировки
+
     @abc.abstractmethod
     def create_connection(self):
         pass
 
+    def transaction(self, read_only=False):
+        # with factory.transaction(): ... - все запросы блока фиксируются одним commit.
+        # read_only=True - блок только читает (SQLite не берет блокировку записи в начале)
+        return UnitOfWork(self, read_only)
+
+    def current_unit_of_work(self):
+        return getattr(self._local, "unit_of_work", None)
+
+    def in_transaction(self):
+        return self.current_unit_of_work() is not None
+
+    def read_factory(self):
+        # Фабрика для запросов только на чтение (DroneMapper). Переопределяется в ReplicatedFactory
+        return self
+
+    def note_write(self):
+        # Вызывается маппером после записи через фабрику
+        pass
+
+    def begin(self, connection, read_only=False):
+        # MySQL и PostgreSQL открывают транзакцию неявно при первом запросе
+        pass
+
+    def on_connection_closed(self, connection):
+        # Освобождение ресурсов фабрики, связанных с соединением (вызывается пулом)
+        pass
+
+    def check_connection(self, connection):
+        # Проверка "живости" соединения перед выдачей из пула
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        finally:
+            cursor.close()
+        return True
+
     @abc.abstractmethod
     def create_query_builder(self):
         pass
 
     @abc.abstractmethod
-    def execute_query(self, connection, query, params=None):
+    def execute_query(self, connection, query, params=None, commit=True):
+        pass
+
+    @abc.abstractmethod
+    def execute_many(self, connection, query, rows, commit=True):
         pass
 
+    def add_hook(self, hook):
+        # Подключает QueryHook: before_query/after_query вызываются для каждого запроса фабрики
+        self.hooks = self.hooks + [hook]
+
+    def remove_hook(self, hook):
+        self.hooks = [registered for registered in self.hooks if registered is not hook]
+
+    def _query_started(self, query, params):
+        if self.hooks:
+            event = QueryEvent(self.db_type, query, params)
+            for hook in self.hooks:
+                hook.before_query(event)
+        return time.perf_counter()
+
+    def _query_finished(self, query, params, started, rowcount):
+        duration = time.perf_counter() - started
+        query_log.record(self.db_type, query, duration, rowcount)
+        if self.hooks:
+            event = QueryEvent(self.db_type, query, params, duration, rowcount)
+            for hook in self.hooks:
+                try:
+                    hook.after_query(event)
+                except Exception as e:
+                    logger.warning(f"Query hook {type(hook).__name__} failed: {e}")
+
+    def execute_stream(self, connection, query, params=None, batch_size=1000):
+        # Курсор для чтения большой выборки порциями через fetchmany.
+        # sqlite3 и так читает строки по мере fetchmany, без буферизации всего результата
+        cursor = self.execute_query(connection, query, params, commit=False)
+        cursor.arraysize = batch_size
+        return cursor
+
+    def close_stream(self, cursor):
+        cursor.close()
+
 
 class SQLiteFactory(AbstractFactory):
+    db_type = "sqlite"
+    # Лимит параметров в одном запросе: 999 до SQLite 3.32, далее 32766
+    max_query_params = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+    multirow_insert = False  # executemany в одной транзакции для SQLite быстрее длинного VALUES
+
+    def __init__(self, database="sqlite_test_db.db", statement_cache_size=256, profile=None, **pool_options):
+        super().__init__(**pool_options)
+        self.database = database
+        # sqlite3 держит LRU-кэш скомпилированных запросов на каждое соединение
+        self.statement_cache_size = statement_cache_size
+        # Профиль PRAGMA из sqlite_profiles.SQLITE_PROFILES ("durable", "ingest", "read-mostly")
+        # или словарь PRAGMA. None - настройки SQLite по умолчанию
+        if isinstance(profile, str) and profile not in SQLITE_PROFILES:
+            raise ValueError(f"Unknown SQLite profile: {profile}")
+        self.profile = profile
+
     def create_connection(self):
         try:
-            connection = sqlite3.connect("sqlite_test_db.db")
+            # Соединение из пула может использоваться разными потоками (по очереди)
+            # "file:...?mode=memory&cache=shared" - общая база в памяти для всех соединений пула
+            connection = sqlite3.connect(self.database, check_same_thread=False,
+                                         cached_statements=self.statement_cache_size,
+                                         uri=self.database.startswith("file:"))
+            apply_profile(connection, self.profile)
             logger.info("SQLite connection established.")
             connection.row_factory = sqlite3.Row  # Позволяет использовать имена колонок
             return connection
@@ -35,25 +172,52 @@ class SQLiteFactory(AbstractFactory):
             logger.error(f"Error connecting to SQLite: {e}")
             raise
 
+    def begin(self, connection, read_only=False):
+        # Модуль sqlite3 сам открывает транзакцию только перед INSERT/UPDATE/DELETE,
+        # поэтому для единицы работы (и точек сохранения внутри нее) открываем ее явно.
+        # BEGIN IMMEDIATE сразу берет блокировку записи: отложенная транзакция, которая сначала
+        # читает, а потом пишет, при конкуренции получает "database is locked" без ожидания busy_timeout
+        if not connection.in_transaction:
+            connection.execute("BEGIN" if read_only else "BEGIN IMMEDIATE")
+
     def create_query_builder(self):
-        return QueryBuilder("sqlite")
+        return QueryBuilder(self.db_type)
 
-    def execute_query(self, connection, query, params=None):
+    def execute_query(self, connection, query, params=None, commit=True):
+        started = self._query_started(query, params)
         cursor = connection.cursor()
         try:
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
-            connection.commit()
-            logger.info(f"SQLite query executed: {query}")
+            if commit and not self.in_transaction():
+                connection.commit()
+            self._query_finished(query, params, started, cursor.rowcount)
             return cursor
         except sqlite3.Error as e:
             logger.error(f"Error executing SQLite query: {e}")
             raise
 
+    def execute_many(self, connection, query, rows, commit=True):
+        started = self._query_started(query, rows)
+        cursor = connection.cursor()
+        try:
+            cursor.executemany(query, rows)
+            if commit and not self.in_transaction():
+                connection.commit()
+            self._query_finished(query, rows, started, cursor.rowcount)
+            return cursor
+        except sqlite3.Error as e:
+            logger.error(f"Error executing SQLite batch query: {e}")
+            raise
+
 
 class MySQLFactory(AbstractFactory):
+    db_type = "mysql"
+    max_query_params = 65535
+    multirow_insert = True  # INSERT ... VALUES (...), (...), ...
+
     def create_connection(self):
         try:
             connection = mysql.connector.connect(
@@ -69,89 +233,1000 @@ class MySQLFactory(AbstractFactory):
             logger.error(f"Error connecting to MySQL: {e}")
             raise
 
+    def check_connection(self, connection):
+        return connection.is_connected()
+
     def create_query_builder(self):
-        return QueryBuilder("mysql")
+        return QueryBuilder(self.db_type)
 
-    def execute_query(self, connection, query, params=None):
+    def execute_query(self, connection, query, params=None, commit=True):
+        started = self._query_started(query, params)
         cursor = connection.cursor(dictionary=True)
         try:
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
-            connection.commit()
-            logger.info(f"MySQL query executed: {query}")
+            if commit and not self.in_transaction():
+                connection.commit()
+            self._query_finished(query, params, started, cursor.rowcount)
             return cursor
         except mysql.connector.Error as e:
             logger.error(f"Error executing MySQL query: {e}")
             raise
 
+    def execute_many(self, connection, query, rows, commit=True):
+        started = self._query_started(query, rows)
+        cursor = connection.cursor()
+        try:
+            cursor.executemany(query, rows)
+            if commit and not self.in_transaction():
+                connection.commit()
+            self._query_finished(query, rows, started, cursor.rowcount)
+            return cursor
+        except mysql.connector.Error as e:
+            logger.error(f"Error executing MySQL batch query: {e}")
+            raise
+
+    def execute_stream(self, connection, query, params=None, batch_size=1000):
+        # Небуферизованный курсор: строки читаются из сокета по мере fetchmany
+        started = self._query_started(query, params)
+        cursor = connection.cursor(dictionary=True, buffered=False)
+        cursor.arraysize = batch_size  # Размер порции и для fetchmany, и для дочитывания в close_stream
+        try:
+            cursor.execute(query, params)
+            self._query_finished(query, params, started, cursor.rowcount)
+            return cursor
+        except mysql.connector.Error as e:
+            logger.error(f"Error executing MySQL streaming query: {e}")
+            raise
+
+    def close_stream(self, cursor):
+        # Непрочитанный остаток небуферизованной выборки нужно дочитать, иначе соединение
+        # не примет следующий запрос ("Unread result found"). Дочитываем порциями и сразу
+        # отбрасываем, чтобы остаток большой выборки не собирался в памяти целиком
+        try:
+            while cursor.fetchmany(cursor.arraysize):
+                pass
+        finally:
+            cursor.close()
+
 
 class PostgreSQLFactory(AbstractFactory):
+    db_type = "postgresql"
+    # id = ANY(%s) передает весь список одним параметром, лимит ограничивает размер массива
+    max_query_params = 10000
+    multirow_insert = True  # executemany в psycopg2 - это цикл из отдельных запросов
+
+    def __init__(self, prepared_statements=True, prepared_cache_size=100, host="localhost", port=5432,
+                 user="PostgreSQL_username", password="PostgreSQL_password", database="PostgreSQL_db",
+                 **pool_options):
+        super().__init__(**pool_options)
+        # Параметры сервера: у primary и каждой реплики свой экземпляр фабрики
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.database = database
+        # psycopg2 не умеет готовить запросы сам, поэтому используем PREPARE/EXECUTE на сервере
+        self.prepared_statements = prepared_statements
+        self.prepared_cache_size = prepared_cache_size
+        self._prepared = {}  # id(соединения) -> LRUCache(текст запроса -> имя подготовленного запроса)
+        self._prepared_names = itertools.count(1)
+        self._cursor_names = itertools.count(1)
+        self._prepared_lock = threading.Lock()
+
     def create_connection(self):
         try:
             connection = psycopg2.connect(
-                host="localhost",
-                user="PostgreSQL_username",
-                password="PostgreSQL_password",
-                database="PostgreSQL_db",
-                port=5432  # PostgreSQL стандартный порт
+                host=self.host,
+                user=self.user,
+                password=self.password,
+                database=self.database,
+                port=self.port,
+                # Строки как словари, как sqlite3.Row и dictionary=True у MySQL: DroneMapper читает row["id"]
+                cursor_factory=psycopg2.extras.RealDictCursor
             )
-            logger.info("PostgreSQL connection established.")
+            logger.info(f"PostgreSQL connection established to {self.host}:{self.port}.")
             return connection
         except psycopg2.Error as e:
             logger.error(f"Error connecting to PostgreSQL: {e}")
             raise
 
+    def check_connection(self, connection):
+        if connection.closed:
+            return False
+        super().check_connection(connection)
+        connection.rollback()  # Закрываем транзакцию, открытую проверочным запросом
+        return True
+
     def create_query_builder(self):
-        return QueryBuilder("postgresql")
+        return QueryBuilder(self.db_type)
 
-    def execute_query(self, connection, query, params=None):
+    def execute_query(self, connection, query, params=None, commit=True):
+        started = self._query_started(query, params)
         cursor = connection.cursor()
         try:
-            if params:
+            if params and self.prepared_statements and query.lstrip()[:6].upper() in PREPARABLE_STATEMENTS:
+                name = self._prepare(connection, cursor, query)
+                placeholders = ', '.join(['%s' for _ in params])
+                cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+            elif params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
-            connection.commit()
-            logger.info(f"PostgreSQL query executed: {query}")
+            if commit and not self.in_transaction():
+                connection.commit()
+            self._query_finished(query, params, started, cursor.rowcount)
             return cursor
         except psycopg2.Error as e:
             logger.error(f"Error executing PostgreSQL query: {e}")
             raise
 
+    def execute_stream(self, connection, query, params=None, batch_size=1000):
+        # Именованный (серверный) курсор: сервер отдает строки порциями по itersize
+        started = self._query_started(query, params)
+        cursor = connection.cursor(name=f"drone_stream_{next(self._cursor_names)}")
+        cursor.itersize = batch_size
+        try:
+            cursor.execute(query, params or None)  # С пустым списком psycopg2 все равно форматирует текст
+            self._query_finished(query, params, started, cursor.rowcount)
+            return cursor
+        except psycopg2.Error as e:
+            logger.error(f"Error executing PostgreSQL streaming query: {e}")
+            raise
+
+    def prepared_stats(self):
+        with self._prepared_lock:
+            caches = list(self._prepared.values())
+        return {
+            "connections": len(caches),
+            "statements": sum(len(cache) for cache in caches),
+            "hits": sum(cache.hits for cache in caches),
+            "misses": sum(cache.misses for cache in caches),
+            "evictions": sum(cache.evictions for cache in caches),
+        }
 
-# Строитель для SQL-запросов
+    def on_connection_closed(self, connection):
+        with self._prepared_lock:
+            self._prepared.pop(id(connection), None)
+
+    def _prepare(self, connection, cursor, query):
+        # Подготовленные запросы живут в сессии, поэтому кэш свой у каждого соединения
+        with self._prepared_lock:
+            statements = self._prepared.get(id(connection))
+            if statements is None:
+                statements = LRUCache(self.prepared_cache_size,
+                                      on_evict=lambda _, name: self._deallocate(connection, name))
+                self._prepared[id(connection)] = statements
+        name = statements.get(query)
+        if name is None:
+            name = f"drone_stmt_{next(self._prepared_names)}"
+            # PREPARE выполняется без параметров: %s -> $1, $2, ..., а удвоенный %% - обратно в %
+            numbered = itertools.count(1)
+            cursor.execute(f"PREPARE {name} AS " + re.sub(r"%%|%s", lambda match: "%" if match.group() == "%%"
+                                                          else f"${next(numbered)}", query))
+            statements.put(query, name)
+        return name
+
+    def _deallocate(self, connection, name):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"DEALLOCATE {name}")
+        except psycopg2.Error as e:
+            logger.warning(f"Error deallocating prepared statement {name}: {e}")
+        finally:
+            cursor.close()
+
+    def execute_many(self, connection, query, rows, commit=True):
+        started = self._query_started(query, rows)
+        cursor = connection.cursor()
+        try:
+            cursor.executemany(query, rows)
+            if commit and not self.in_transaction():
+                connection.commit()
+            self._query_finished(query, rows, started, cursor.rowcount)
+            return cursor
+        except psycopg2.Error as e:
+            logger.error(f"Error executing PostgreSQL batch query: {e}")
+            raise
+
+
+# Маршрутизация по репликам: записи, транзакции и DDL идут в primary (пул соединений общий с ним),
+# чтение из DroneMapper - в одну из реплик. Реплика выбирается стратегией:
+#   "round-robin"   - по кругу;
+#   "least-latency" - с наименьшей сглаженной задержкой запросов (доля explore_rate чтений идет
+#                     по кругу, чтобы задержка остальных реплик не устаревала).
+# Read-your-writes: после записи поток sticky_seconds читает с primary, пока реплики догоняют
+class ReplicatedFactory(AbstractFactory):
+    def __init__(self, primary, replicas, strategy="round-robin", sticky_seconds=5.0, explore_rate=0.1):
+        if strategy not in ("round-robin", "least-latency"):
+            raise ValueError(f"Unknown replica selection strategy: {strategy}")
+        super().__init__()
+        self.pool = primary.pool
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.strategy = strategy
+        self.sticky_seconds = sticky_seconds
+        self.explore_rate = explore_rate
+        self.db_type = primary.db_type
+        self.max_query_params = min(factory.max_query_params for factory in [primary, *self.replicas])
+        self.multirow_insert = primary.multirow_insert
+        self._next_replica = itertools.count()
+        self._latencies = [ReplicaLatency() for _ in self.replicas]
+        for replica, latency in zip(self.replicas, self._latencies):
+            replica.add_hook(latency)
+        self.primary_reads = 0
+
+    def read_factory(self):
+        # Внутри единицы работы и сразу после записи читаем с primary
+        if not self.replicas or self.in_transaction() or time.monotonic() < getattr(self._local, "sticky_until", 0):
+            self.primary_reads += 1
+            return self
+        if self.strategy == "least-latency" and random.random() >= self.explore_rate:
+            index = min(range(len(self.replicas)), key=lambda i: self._latencies[i].estimate())
+        else:
+            index = next(self._next_replica) % len(self.replicas)
+        self._latencies[index].reads += 1
+        return self.replicas[index]
+
+    def note_write(self):
+        self._local.sticky_until = time.monotonic() + self.sticky_seconds
+
+    def replica_stats(self):
+        return {
+            "primary_reads": self.primary_reads,
+            "replicas": [{"reads": latency.reads, "latency_ms": latency.ewma * 1000} for latency in self._latencies],
+        }
+
+    def create_connection(self):
+        return self.primary.create_connection()
+
+    def create_query_builder(self):
+        return self.primary.create_query_builder()
+
+    def begin(self, connection, read_only=False):
+        self.primary.begin(connection, read_only)
+
+    def check_connection(self, connection):
+        return self.primary.check_connection(connection)
+
+    def on_connection_closed(self, connection):
+        self.primary.on_connection_closed(connection)
+
+    # Единица работы открыта на этой фабрике, а не на primary, поэтому commit решается здесь
+    def execute_query(self, connection, query, params=None, commit=True):
+        return self.primary.execute_query(connection, query, params, commit=commit and not self.in_transaction())
+
+    def execute_many(self, connection, query, rows, commit=True):
+        return self.primary.execute_many(connection, query, rows, commit=commit and not self.in_transaction())
+
+    def execute_stream(self, connection, query, params=None, batch_size=1000):
+        return self.primary.execute_stream(connection, query, params, batch_size)
+
+    def close_stream(self, cursor):
+        self.primary.close_stream(cursor)
+
+    def add_hook(self, hook):
+        for factory in [self.primary, *self.replicas]:
+            factory.add_hook(hook)
+
+    def remove_hook(self, hook):
+        for factory in [self.primary, *self.replicas]:
+            factory.remove_hook(hook)
+
+
+# Журнал запросов. Текст сообщения собирается только если уровень включен (аргументы %-формата,
+# а не f-строки), поля backend/duration_ms/rowcount/sql передаются в extra для структурных обработчиков.
+# Все запросы пишутся на DEBUG, медленные (>= slow_threshold секунд) - на WARNING с выборкой slow_sample_rate
+class QueryLog:
+    def __init__(self, logger, slow_threshold=0.1, slow_sample_rate=1.0):
+        self.logger = logger
+        self.slow_threshold = slow_threshold
+        self.slow_sample_rate = slow_sample_rate
+
+    def record(self, backend, query, duration, rowcount):
+        if duration >= self.slow_threshold:
+            if self.logger.isEnabledFor(logging.WARNING) and \
+                    (self.slow_sample_rate >= 1.0 or random.random() < self.slow_sample_rate):
+                self.logger.warning("Slow %s query (%.1f ms, %s rows): %s", backend, duration * 1000, rowcount, query,
+                                    extra=self._fields(backend, query, duration, rowcount))
+        elif self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("%s query executed (%.3f ms, %s rows): %s", backend, duration * 1000, rowcount, query,
+                              extra=self._fields(backend, query, duration, rowcount))
+
+    @staticmethod
+    def _fields(backend, query, duration, rowcount):
+        return {"backend": backend, "duration_ms": duration * 1000, "rowcount": rowcount, "sql": query}
+
+
+# Сведения о запросе для инструментирования. sql - нормализованный шаблон (списки плейсхолдеров
+# свернуты), params_shape - типы параметров без значений. duration и rowcount заполнены только после выполнения
+class QueryEvent:
+    __slots__ = ("backend", "raw_sql", "params", "duration", "rowcount")
+
+    def __init__(self, backend, raw_sql, params, duration=None, rowcount=None):
+        self.backend = backend
+        self.raw_sql = raw_sql
+        self.params = params
+        self.duration = duration
+        self.rowcount = rowcount
+
+    @property
+    def sql(self):
+        return normalize_sql(self.raw_sql)
+
+    @property
+    def params_shape(self):
+        if not self.params:
+            return ()
+        if isinstance(self.params, list) and self.params and isinstance(self.params[0], (tuple, list)):
+            return ("batch", len(self.params), len(self.params[0]))  # Строки executemany
+        kinds = [f"list[{len(param)}]" if isinstance(param, (list, tuple)) else type(param).__name__
+                 for param in self.params]
+        # Подряд идущие одинаковые типы сворачиваются: ("int", "int", "int") -> ("int*3",)
+        return tuple(kind if count == 1 else f"{kind}*{count}"
+                     for kind, count in ((kind, len(list(group))) for kind, group in itertools.groupby(kinds)))
+
+
+# Базовый класс хука: переопределяются нужные методы
+class QueryHook:
+    def before_query(self, event):
+        pass
+
+    def after_query(self, event):
+        pass
+
+
+# Экспоненциально сглаженная задержка запросов реплики для ReplicatedFactory(strategy="least-latency")
+class ReplicaLatency(QueryHook):
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.ewma = 0.0
+        self.samples = 0
+        self.reads = 0
+
+    def after_query(self, event):
+        if self.samples:
+            self.ewma += self.alpha * (event.duration - self.ewma)
+        else:
+            self.ewma = event.duration
+        self.samples += 1
+
+    def estimate(self):
+        # Реплика без замеров выбирается первой
+        return self.ewma if self.samples else 0.0
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(query):
+    # "IN (?, ?, ?)" и многострочные VALUES (...), (...) сводятся к одному шаблону, литералы - к ?
+    query = " ".join(query.split())
+    query = re.sub(r"'(?:[^']|'')*'", "?", query)
+    query = re.sub(r"\b\d+(?:\.\d+)?\b", "?", query)
+    query = re.sub(r"(?:\?|%s|\$\?)(?:\s*,\s*(?:\?|%s|\$\?))+", "...", query)
+    query = re.sub(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+", "(...)", query)
+    return query
+
+
+# Агрегатор длительностей: p50/p95/p99 по каждому нормализованному шаблону запроса.
+# На шаблон хранится не больше max_samples последних замеров
+class QueryStatsAggregator(QueryHook):
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def after_query(self, event):
+        key = (event.backend, event.sql)
+        with self._lock:
+            stats = self._templates.get(key)
+            if stats is None:
+                stats = self._templates[key] = {"count": 0, "rows": 0, "total": 0.0,
+                                                "samples": collections.deque(maxlen=self.max_samples)}
+            stats["count"] += 1
+            stats["rows"] += max(event.rowcount or 0, 0)
+            stats["total"] += event.duration
+            stats["samples"].append(event.duration)
+
+    def report(self):
+        with self._lock:
+            snapshot = {key: (stats["count"], stats["rows"], stats["total"], sorted(stats["samples"]))
+                        for key, stats in self._templates.items()}
+        report = {}
+        for (backend, sql), (count, rows, total, samples) in snapshot.items():
+            report[(backend, sql)] = {
+                "count": count,
+                "rows": rows,
+                "mean_ms": total / count * 1000,
+                "p50_ms": _percentile(samples, 50) * 1000,
+                "p95_ms": _percentile(samples, 95) * 1000,
+                "p99_ms": _percentile(samples, 99) * 1000,
+                "max_ms": samples[-1] * 1000,
+            }
+        return report
+
+    def reset(self):
+        with self._lock:
+            self._templates.clear()
+
+
+def _percentile(sorted_samples, percent):
+    # Метод ближайшего ранга
+    index = max(0, math.ceil(percent / 100 * len(sorted_samples)) - 1)
+    return sorted_samples[index]
+
+
+# Захват плана выполнения для запросов медленнее threshold секунд - один раз на шаблон.
+# EXPLAIN выполняется на отдельном соединении: курсор исходного запроса может быть еще не прочитан
+class ExplainCapture(QueryHook):
+    explain_prefixes = {"sqlite": "EXPLAIN QUERY PLAN ", "mysql": "EXPLAIN ", "postgresql": "EXPLAIN "}
+
+    def __init__(self, factory, threshold=0.1):
+        self.factory = factory
+        self.threshold = threshold
+        self.plans = {}  # (backend, шаблон) -> строки плана
+        self._lock = threading.Lock()
+
+    def after_query(self, event):
+        if event.duration < self.threshold or not event.raw_sql.lstrip()[:6].upper() == "SELECT":
+            return
+        key = (event.backend, event.sql)
+        with self._lock:
+            if key in self.plans:
+                return
+            self.plans[key] = None  # Занимаем шаблон, чтобы параллельные потоки не повторяли EXPLAIN
+        connection = self.factory.create_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(self.explain_prefixes[event.backend] + event.raw_sql, event.params or None)
+            plan = [tuple(row) if not isinstance(row, dict) else tuple(row.values()) for row in cursor.fetchall()]
+            cursor.close()
+        finally:
+            connection.close()
+        with self._lock:
+            self.plans[key] = plan
+        logger.warning(f"Slow query plan ({event.duration * 1000:.1f} ms): {event.sql} -> {plan}")
+
+
+# QueueHandler, который не форматирует запись в потоке вызова: форматирование целиком уходит
+# в поток QueueListener (аргументы записей журнала запросов - неизменяемые строки и числа)
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        return record
+
+
+query_log = QueryLog(logging.getLogger(f"{__name__}.queries"))
+
+
+# Переводит журнал запросов на запись в отдельном потоке. Возвращает QueueListener, который
+# нужно остановить (listener.stop()) при завершении, чтобы дописать очередь
+def start_query_log_listener(*handlers):
+    log_queue = queue.SimpleQueue()
+    query_log.logger.addHandler(DeferredQueueHandler(log_queue))
+    query_log.logger.propagate = False
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+# Единица работы: одна транзакция на весь блок with, вложенные блоки - через точки сохранения
+class UnitOfWork:
+    def __init__(self, factory, read_only=False):
+        self.factory = factory
+        self.read_only = read_only
+        self.connection = None
+        self.depth = 0
+        # Карта идентичности: в пределах единицы работы один id - один объект Drone
+        self.identity_map = {}
+        self._outer = None
+
+    def __enter__(self):
+        self._outer = self.factory.current_unit_of_work()
+        if self._outer is None:
+            self.connection = self.factory.pool.acquire()
+            try:
+                self.factory.begin(self.connection, self.read_only)
+            except Exception:
+                self.factory.pool.release(self.connection, discard=True)
+                raise
+        else:
+            self.connection = self._outer.connection
+            self.identity_map = self._outer.identity_map
+            self.depth = self._outer.depth + 1
+            self._execute(f"SAVEPOINT {self._savepoint_name()}")
+        self.factory._local.unit_of_work = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.factory._local.unit_of_work = self._outer
+        if self._outer is not None:
+            # Вложенный блок: откатывается только его часть работы
+            if exc_type is not None:
+                self._execute(f"ROLLBACK TO SAVEPOINT {self._savepoint_name()}")
+                self.identity_map.clear()  # Могла содержать строки, записанные в откаченном блоке
+            self._execute(f"RELEASE SAVEPOINT {self._savepoint_name()}")
+            return False
+        try:
+            if exc_type is None:
+                self.connection.commit()
+                logger.info(f"Unit of work committed for {type(self.factory).__name__} database.")
+            else:
+                self.connection.rollback()
+                logger.info(f"Unit of work rolled back for {type(self.factory).__name__} database.")
+        except Exception:
+            self.factory.pool.release(self.connection, discard=True)
+            raise
+        self.factory.pool.release(self.connection)
+        return False
+
+    def _savepoint_name(self):
+        return f"uow_savepoint_{self.depth}"
+
+    def _execute(self, statement):
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+# Пул соединений: ограниченный размер, выдача/возврат, время простоя и проверка соединений
+class ConnectionPool:
+    def __init__(self, factory, max_size=5, idle_timeout=300.0, timeout=30.0, ping_after=30.0):
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout  # Сколько секунд свободное соединение может простаивать
+        self.timeout = timeout  # Сколько секунд ждать свободного соединения
+        # Проверка соединения при выдаче - только если оно простояло дольше ping_after секунд
+        # (0 - проверять всегда, None - никогда)
+        self.ping_after = ping_after
+        self._idle = collections.deque()  # Пары (соединение, время возврата в пул)
+        self._size = 0  # Все открытые соединения: свободные и выданные
+        self._condition = threading.Condition()
+        # Счетчики для подбора размера пула под нагрузкой
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.discarded = 0
+
+    def acquire(self):
+        started = time.monotonic()
+        while True:
+            connection, returned_at = self._reserve(started)
+            if connection is None:
+                # Свободных соединений нет, но лимит не достигнут - открываем новое
+                try:
+                    connection = self.factory.create_connection()
+                except Exception:
+                    self._forget()
+                    raise
+                self._record(started, hit=False)
+                return connection
+            if not self._needs_ping(returned_at) or self._is_healthy(connection):
+                self._record(started, hit=True)
+                return connection
+            self._close(connection)
+            self._forget()
+
+    def release(self, connection, discard=False):
+        if discard:
+            self._close(connection)
+            self._forget()
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close_all(self):
+        with self._condition:
+            while self._idle:
+                connection, _ = self._idle.popleft()
+                self._close(connection)
+                self._size -= 1
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            requests = self.hits + self.misses
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "waits": self.waits,
+                "wait_time": self.wait_time,
+                "max_wait_time": self.max_wait_time,
+                "discarded": self.discarded,
+            }
+
+    def _reserve(self, started):
+        # Возвращает (свободное соединение, время его возврата в пул)
+        # или (None, None), если зарезервировано место под новое
+        with self._condition:
+            waited = False
+            while True:
+                self._expire_idle()
+                if self._idle:
+                    return self._idle.pop()  # Самое "свежее" соединение
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, None
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise TimeoutError(f"No free connection in pool for {type(self.factory).__name__} "
+                                       f"after {self.timeout} s.")
+                self._condition.wait(remaining)
+
+    def _expire_idle(self):
+        # Закрывает соединения, простаивавшие дольше idle_timeout (самые старые - слева)
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            connection, _ = self._idle.popleft()
+            self._close(connection)
+            self._size -= 1
+
+    def _needs_ping(self, returned_at):
+        return self.ping_after is not None and time.monotonic() - returned_at >= self.ping_after
+
+    def _is_healthy(self, connection):
+        try:
+            return self.factory.check_connection(connection)
+        except Exception as e:
+            logger.warning(f"Pooled connection failed health check: {e}")
+            return False
+
+    def _forget(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _close(self, connection):
+        self.discarded += 1
+        self.factory.on_connection_closed(connection)
+        try:
+            connection.close()
+        except Exception as e:
+            logger.warning(f"Error closing pooled connection: {e}")
+
+    def _record(self, started, hit):
+        elapsed = time.monotonic() - started
+        with self._condition:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.wait_time += elapsed
+            self.max_wait_time = max(self.max_wait_time, elapsed)
+
+
+# LRU-кэш с ограничением размера, необязательным временем жизни записей (ttl, секунды)
+# и счетчиками попаданий/промахов/вытеснений
+class LRUCache:
+    def __init__(self, max_size=256, on_evict=None, ttl=None):
+        self.max_size = max_size
+        self.on_evict = on_evict  # Вызывается с (ключ, значение) для вытесненной записи
+        self.ttl = ttl
+        self._data = collections.OrderedDict()  # ключ -> (значение, момент устаревания или None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires_at = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        evicted = []
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                evicted_key, (evicted_value, _) = self._data.popitem(last=False)
+                evicted.append((evicted_key, evicted_value))
+                self.evictions += 1
+        if self.on_evict:
+            for evicted_key, evicted_value in evicted:
+                self.on_evict(evicted_key, evicted_value)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            value, _ = self._data.pop(key, (default, None))
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+# Общий кэш текстов запросов: ключ - форма запроса (диалект, таблица, колонки, условия), а не параметры
+query_cache = LRUCache(max_size=256)
+
+
+# "?" вне строковых литералов и идентификаторов в кавычках
+_QUESTION_MARKS = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`)|\?""")
+
+
+# Строитель для SQL-запросов. Методы запоминают форму запроса в виде дерева: оператор
+# (select/insert/upsert/delete), условия WHERE и LIMIT/OFFSET. Узлы не зависят от СУБД, диалект
+# учитывается только при компиляции в get_query(): текст собирается один раз на каждую пару
+# (диалект, форма) и дальше берется из query_cache
 class QueryBuilder:
-    def __init__(self, db_type):
+    def __init__(self, db_type, cache=None):
         self.query = ""
         self.params = []
         self.db_type = db_type
+        self.cache = query_cache if cache is None else cache
+        self._statement = None
+        self._conditions = []  # (узел, значения параметров)
+        self._order = None  # (колонки, descending)
+        self._after = None  # Ключ последней строки предыдущей страницы
+        self._limit = None
+        self._offset = None
 
     def select(self, table, columns):
-        columns_str = ', '.join(columns)
-        self.query = f"SELECT {columns_str} FROM {table}"
+        self._reset(("select", table, tuple(columns)))
         return self
 
-    def where(self, condition):
-        self.query += f" WHERE {condition}"
+    def where(self, condition, *params):
+        # Условие пишется с нейтральным плейсхолдером "?": where("id = ?", drone_id).
+        # При компиляции для MySQL/PostgreSQL он заменяется на %s (кроме "?" внутри кавычек)
+        self._conditions.append((("where", condition), params))
         return self
 
-    def insert(self, table, columns):
-        columns_str = ', '.join(columns)
-        placeholders = ', '.join(['?' if self.db_type == 'sqlite' else '%s' for _ in columns])
-        self.query = f"INSERT INTO {table} ({columns_str}) VALUES ({placeholders})"
+    def where_in(self, column, values):
+        values = list(values)
+        if not values:
+            self._conditions.append((("where_false",), ()))
+        else:
+            self._conditions.append((("where_in", column, len(values)), values))
+        return self
+
+    def where_in_rows(self, columns, rows):
+        # Поиск по составному ключу: (a, b) IN ((?, ?), ...). rows - кортежи значений колонок
+        rows = list(rows)
+        if not rows:
+            self._conditions.append((("where_false",), ()))
+        else:
+            self._conditions.append((("where_in_rows", tuple(columns), len(rows)),
+                                     [value for row in rows for value in row]))
+        return self
+
+    def where_between(self, column, low, high):
+        # Полуоткрытый интервал [low, high), как у range()
+        self._conditions.append((("where_between", column), (low, high)))
+        return self
+
+    def order_by(self, *columns, descending=False):
+        self._order = (tuple(columns), descending)
+        return self
+
+    def after(self, last_key):
+        # Keyset-пагинация: строки строго после last_key в порядке order_by.
+        # last_key - значения колонок order_by последней строки предыдущей страницы (кортеж или одно значение).
+        # Сервер сразу переходит к ключу по индексу, поэтому глубина страницы не влияет на стоимость
+        self._after = tuple(last_key) if isinstance(last_key, (tuple, list)) else (last_key,)
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def offset(self, count):
+        self._offset = count
+        return self
+
+    def placeholder(self):
+        return '?' if self.db_type == 'sqlite' else '%s'
+
+    def insert(self, table, columns, rows=1, ignore_conflicts=False):
+        # rows > 1 - многострочный VALUES, ignore_conflicts - пропуск дубликатов силами СУБД
+        self._reset(("insert", table, tuple(columns), rows, ignore_conflicts))
+        return self
+
+    def upsert(self, table, columns, conflict_columns, update_columns=()):
+        # Вставка с разрешением конфликта по уникальному ключу силами СУБД.
+        # Без update_columns существующая строка остается нетронутой
+        self._reset(("upsert", table, tuple(columns), tuple(conflict_columns), tuple(update_columns)))
+        return self
+
+    def delete(self, table):
+        # Условия задаются через where/where_in, как у select
+        self._reset(("delete", table))
         return self
 
     def get_query(self):
-        return self.query
+        key = (self.db_type, self._statement, tuple(node for node, _ in self._conditions), self._order,
+               self._after is not None, self._limit is not None, self._offset is not None)
+        query = self.cache.get(key)
+        if query is None:
+            query = self._compile()
+            self.cache.put(key, query)
+        self.query = query
+        return query
 
     def get_params(self):
-        return self.params
+        # Порядок значений совпадает с порядком плейсхолдеров в скомпилированном тексте
+        params = []
+        for node, values in self._conditions:
+            if node[0] == "where_in" and self.db_type == 'postgresql':
+                params.append(list(values))  # Весь список - один параметр-массив для = ANY(%s)
+            else:
+                params.extend(values)
+        if self._after is not None:
+            params.extend(self._after)
+        if self._limit is not None:
+            params.append(self._limit)
+        if self._offset is not None:
+            params.append(self._offset)
+        self.params = params
+        return params
+
+    def _reset(self, statement):
+        self._statement = statement
+        self._conditions = []
+        self._order = None
+        self._after = None
+        self._limit = None
+        self._offset = None
+
+    def _compile(self):
+        query = self._compile_part(*self._statement)
+        conditions = [self._compile_part(*node) for node, _ in self._conditions]
+        if self._after is not None:
+            if self._order is None:
+                raise ValueError("after() requires order_by() with the key columns")
+            conditions.append(self._compile_after(*self._order))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if self._order is not None:
+            query += self._compile_order_by(*self._order)
+        query += self._compile_limit(self._limit is not None, self._offset is not None)
+        if self.db_type == 'postgresql' and '%s' not in query.replace('%%', ''):
+            # Запрос без параметров выполняется без форматирования: %% вернется к исходному %
+            query = query.replace('%%', '%')
+        return query
+
+    def _compile_part(self, kind, *args):
+        return getattr(self, f"_compile_{kind}")(*args)
+
+    def _compile_select(self, table, columns):
+        columns_str = ', '.join(columns)
+        return f"SELECT {columns_str} FROM {table}"
+
+    def _compile_delete(self, table):
+        return f"DELETE FROM {table}"
 
+    def _compile_where(self, condition):
+        if self.db_type == 'sqlite':
+            return condition
+        if self.db_type == 'postgresql':
+            # psycopg2 с параметрами форматирует весь текст через %, поэтому литеральный % удваивается.
+            # mysql.connector подставляет только %s, а прочие % передает как есть
+            condition = condition.replace('%', '%%')
+        return _QUESTION_MARKS.sub(lambda match: match.group(1) or '%s', condition)
 
-# Класс для представления дрона
+    def _compile_where_false(self):
+        return "1 = 0"  # Пустой IN () - синтаксическая ошибка, а условие заведомо ложно
+
+    def _compile_where_in(self, column, count):
+        # PostgreSQL принимает список одним параметром-массивом, остальные - IN (?, ?, ...)
+        if self.db_type == 'postgresql':
+            return f"{column} = ANY({self.placeholder()})"
+        placeholders = ', '.join([self.placeholder() for _ in range(count)])
+        return f"{column} IN ({placeholders})"
+
+    def _compile_where_in_rows(self, columns, count):
+        # SQLite сравнивает значение строки с IN только полным перебором таблицы, а цепочку
+        # OR из равенств выполняет поиском по индексу на каждый ключ (MULTI-INDEX OR).
+        # MySQL и PostgreSQL сами разворачивают (a, b) IN ((...), ...) в поиск по индексу
+        if self.db_type == 'sqlite':
+            term = "(" + " AND ".join(f"{column} = ?" for column in columns) + ")"
+            return "(" + " OR ".join([term] * count) + ")"
+        row = "(" + ", ".join([self.placeholder()] * len(columns)) + ")"
+        return f"({', '.join(columns)}) IN ({', '.join([row] * count)})"
+
+    def _compile_where_between(self, column):
+        return f"{column} >= {self.placeholder()} AND {column} < {self.placeholder()}"
+
+    def _compile_after(self, columns, descending):
+        # Сравнение кортежей (a, b) > (?, ?) поддерживают все три СУБД и используют для него
+        # составной индекс по колонкам order_by
+        operator = "<" if descending else ">"
+        if len(columns) == 1:
+            return f"{columns[0]} {operator} {self.placeholder()}"
+        placeholders = ', '.join([self.placeholder() for _ in columns])
+        return f"({', '.join(columns)}) {operator} ({placeholders})"
+
+    def _compile_order_by(self, columns, descending):
+        direction = " DESC" if descending else ""
+        return " ORDER BY " + ", ".join(f"{column}{direction}" for column in columns)
+
+    def _compile_limit(self, has_limit, has_offset):
+        if not has_limit and not has_offset:
+            return ""
+        if has_limit:
+            query = f" LIMIT {self.placeholder()}"
+        elif self.db_type == 'sqlite':
+            query = " LIMIT -1"  # SQLite и MySQL не принимают OFFSET без LIMIT
+        elif self.db_type == 'mysql':
+            query = " LIMIT 18446744073709551615"
+        else:
+            query = ""
+        if has_offset:
+            query += f" OFFSET {self.placeholder()}"
+        return query
+
+    def _compile_insert(self, table, columns, rows, ignore_conflicts):
+        columns_str = ', '.join(columns)
+        placeholders = ', '.join([self.placeholder() for _ in columns])
+        values = ', '.join([f"({placeholders})" for _ in range(rows)])
+        if not ignore_conflicts:
+            return f"INSERT INTO {table} ({columns_str}) VALUES {values}"
+        elif self.db_type == 'sqlite':
+            return f"INSERT OR IGNORE INTO {table} ({columns_str}) VALUES {values}"
+        elif self.db_type == 'mysql':
+            return f"INSERT IGNORE INTO {table} ({columns_str}) VALUES {values}"
+        return f"INSERT INTO {table} ({columns_str}) VALUES {values} ON CONFLICT DO NOTHING"
+
+    def _compile_upsert(self, table, columns, conflict_columns, update_columns):
+        query = self._compile_insert(table, columns, 1, False)
+        if self.db_type == 'mysql':
+            if update_columns:
+                updates = ', '.join([f"{column} = VALUES({column})" for column in update_columns])
+            else:
+                updates = f"{conflict_columns[0]} = {conflict_columns[0]}"  # Пустое обновление
+            return query + f" ON DUPLICATE KEY UPDATE {updates}"
+        # SQLite (3.24+) и PostgreSQL используют одинаковый синтаксис
+        conflict_str = ', '.join(conflict_columns)
+        if update_columns:
+            updates = ', '.join([f"{column} = excluded.{column}" for column in update_columns])
+            return query + f" ON CONFLICT ({conflict_str}) DO UPDATE SET {updates}"
+        return query + f" ON CONFLICT ({conflict_str}) DO NOTHING"
+
+
+# Класс для представления дрона. __slots__ убирает __dict__ у каждого экземпляра
 class Drone:
+    __slots__ = ("drone_id", "manufacturer", "model", "battery_capacity")
+
     def __init__(self, drone_id, manufacturer, model, battery_capacity):
         self.drone_id = drone_id
         self.manufacturer = manufacturer
@@ -163,94 +1238,781 @@ class Drone:
                 f"model='{self.model}', battery_capacity='{self.battery_capacity}')")
 
 
+# Колоночный контейнер для большого числа дронов: id - в массиве array('q'),
+# строки интернированы, поэтому повторяющиеся производители и модели хранятся один раз.
+# Drone создается только при обращении к элементу
+class DroneBatch:
+    def __init__(self):
+        self.ids = array.array("q")  # Поддерживает буферный протокол: numpy.frombuffer(batch.ids, "int64")
+        self.manufacturers = []
+        self.models = []
+        self.battery_capacities = []
+
+    def append(self, drone_id, manufacturer, model, battery_capacity):
+        self.ids.append(drone_id)
+        self.manufacturers.append(_intern(manufacturer))
+        self.models.append(_intern(model))
+        self.battery_capacities.append(_intern(battery_capacity))
+
+    def extend_rows(self, rows):
+        # Заполнение прямо из строк курсора, без промежуточных объектов Drone
+        for row in rows:
+            self.append(row["id"], row["manufacturer"], row["model"], row["battery_capacity"])
+
+    def capacity_mah(self):
+        # Числовая колонка емкости для аналитики: "3830 mAh" -> 3830, нераспознанные значения -> -1
+        return array.array("q", [_parse_mah(capacity) for capacity in self.battery_capacities])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        return Drone(self.ids[index], self.manufacturers[index], self.models[index], self.battery_capacities[index])
+
+    def __iter__(self):
+        for index in range(len(self.ids)):
+            yield self[index]
+
+
+# Отрицательная запись кэша: id не найден при данном значении factory.write_generation
+class _NotFound:
+    __slots__ = ("generation",)
+
+    def __init__(self, generation):
+        self.generation = generation
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _parse_mah(capacity):
+    try:
+        return int(str(capacity).split()[0])
+    except (ValueError, IndexError):
+        return -1
+
+
 # Использует фабрику для создания соединения и поиска дрона по ID.
+# С autocommit=True каждый вызов вне транзакции фиксируется своим commit. С autocommit=False
+# первая запись открывает единицу работы маппера (или присоединяется к уже открытой в потоке),
+# и изменения фиксируются одним commit() или отменяются rollback(). Такой маппер
+# используется из одного потока: единица работы привязана к потоку, который ее открыл
 class DroneMapper:
-    def __init__(self, factory):
+    def __init__(self, factory, cache=None, autocommit=True):
         self.factory = factory
+        # Необязательный общий кэш find_by_id (например, LRUCache(max_size=10000, ttl=60)).
+        # Один экземпляр можно отдать нескольким мапперам: ключи разделены по фабрикам
+        self.cache = cache
+        self.autocommit = autocommit
+        self.identity_map_hits = 0
+        self._unit_of_work = None  # Единица работы, открытая самим маппером при autocommit=False
+
+    def commit(self):
+        # Фиксирует изменения, накопленные с autocommit=False. Без открытой единицы работы ничего не делает
+        self._finish(None)
+
+    def rollback(self):
+        self._finish(RuntimeError)
+
+    def _finish(self, exc_type):
+        unit_of_work, self._unit_of_work = self._unit_of_work, None
+        if unit_of_work is not None:
+            # __exit__ с типом исключения откатывает транзакцию, без него - фиксирует
+            unit_of_work.__exit__(exc_type, None, None)
+
+    def _begin_write(self):
+        # Перед записью с autocommit=False: открываем свою единицу работы, если в потоке нет чужой
+        if self.autocommit or self._unit_of_work is not None or self.factory.in_transaction():
+            return
+        self._unit_of_work = self.factory.transaction()
+        self._unit_of_work.__enter__()
 
     def find_by_id(self, drone_id):
-        with DBConnectionManager(self.factory) as connection:
+        known, drone = self._lookup_cached(drone_id)
+        if known:
+            return drone
+        factory = self.factory.read_factory()
+        with DBConnectionManager(factory) as connection:
             try:
-                query_builder = self.factory.create_query_builder()
+                query_builder = factory.create_query_builder()
                 query = query_builder.select("drones", ["id", "manufacturer", "model", "battery_capacity"]) \
-                    .where("id = ?") \
+                    .where("id = ?", drone_id) \
                     .get_query()
-                cursor = self.factory.execute_query(connection, query, (drone_id,))
+                cursor = factory.execute_query(connection, query, query_builder.get_params(), commit=False)
                 result = cursor.fetchone()
                 cursor.close()
                 if result:
-                    return Drone(result["id"], result["manufacturer"], result["model"], result["battery_capacity"])
+                    drone = self._row_to_drone(result)
                 else:
-                    logger.info(f"Drone with ID {drone_id} not found.")
+                    logger.info("Drone with ID %s not found.", drone_id)
             except Exception as e:
                 logger.error(f"Error finding drone by ID {drone_id}: {str(e)}")
                 raise
-            return None
+        self._remember(drone_id, drone)
+        return drone
+
+    def find_by_ids(self, drone_ids):
+        # Один запрос WHERE id IN (...) на каждую порцию id вместо запроса на каждый id.
+        # id, уже известные карте идентичности или кэшу, в запрос не попадают
+        drone_ids = list(dict.fromkeys(drone_ids))
+        found = {}
+        unknown_ids = []
+        for drone_id in drone_ids:
+            known, drone = self._lookup_cached(drone_id)
+            if not known:
+                unknown_ids.append(drone_id)
+            elif drone is not None:
+                found[drone_id] = drone
+        if unknown_ids:
+            factory = self.factory.read_factory()
+            chunk_size = factory.max_query_params
+            with DBConnectionManager(factory) as connection:
+                try:
+                    for start in range(0, len(unknown_ids), chunk_size):
+                        query_builder = factory.create_query_builder()
+                        query = query_builder.select("drones", ["id", "manufacturer", "model", "battery_capacity"]) \
+                            .where_in("id", unknown_ids[start:start + chunk_size]) \
+                            .get_query()
+                        cursor = factory.execute_query(connection, query, query_builder.get_params(),
+                                                            commit=False)
+                        for row in cursor.fetchall():
+                            drone = self._row_to_drone(row)
+                            found[drone.drone_id] = drone
+                        cursor.close()
+                except Exception as e:
+                    logger.error(f"Error finding drones by {len(unknown_ids)} IDs: {str(e)}")
+                    raise
+            for drone_id in unknown_ids:
+                self._remember(drone_id, found.get(drone_id))
+        self._report_missing(drone_ids, found)
+        return found
+
+    def invalidate(self, drone_id):
+        # Вызывается после изменения или удаления строки с этим id
+        unit_of_work = self.factory.current_unit_of_work()
+        if unit_of_work is not None:
+            unit_of_work.identity_map.pop(("drones", drone_id), None)
+        if self.cache is not None:
+            self.cache.pop((self.factory.cache_namespace, drone_id))
+
+    def cache_stats(self):
+        stats = {"identity_map_hits": self.identity_map_hits}
+        if self.cache is not None:
+            stats.update(self.cache.stats())
+        return stats
+
+    def _lookup_cached(self, drone_id):
+        # (True, Drone или None для известного отсутствия) либо (False, None), если надо идти в базу
+        unit_of_work = self.factory.current_unit_of_work()
+        if unit_of_work is not None:
+            entry = unit_of_work.identity_map.get(("drones", drone_id))
+            if entry is not None and self._is_fresh(entry):
+                self.identity_map_hits += 1
+                return True, self._entry_to_drone(entry)
+        if self.cache is not None:
+            key = (self.factory.cache_namespace, drone_id)
+            entry = self.cache.get(key)
+            if entry is not None:
+                if self._is_fresh(entry):
+                    if unit_of_work is not None:
+                        unit_of_work.identity_map[("drones", drone_id)] = entry
+                    return True, self._entry_to_drone(entry)
+                self.cache.pop(key)
+        return False, None
+
+    def _remember(self, drone_id, drone):
+        entry = drone if drone is not None else _NotFound(self.factory.write_generation)
+        unit_of_work = self.factory.current_unit_of_work()
+        if unit_of_work is not None:
+            # Незафиксированные данные транзакции в общий кэш не попадают
+            unit_of_work.identity_map[("drones", drone_id)] = entry
+        elif self.cache is not None:
+            self.cache.put((self.factory.cache_namespace, drone_id), entry)
+
+    def _after_write(self):
+        # Новая строка могла занять id, закэшированный как отсутствующий
+        self.factory.write_generation += 1
+        self.factory.note_write()
+
+    def _is_fresh(self, entry):
+        return not isinstance(entry, _NotFound) or entry.generation == self.factory.write_generation
+
+    @staticmethod
+    def _entry_to_drone(entry):
+        return None if isinstance(entry, _NotFound) else entry
+
+    def find_range(self, low, high):
+        # Все дроны с id из [low, high) одним запросом
+        factory = self.factory.read_factory()
+        found = {}
+        with DBConnectionManager(factory) as connection:
+            try:
+                query_builder = factory.create_query_builder()
+                query = query_builder.select("drones", ["id", "manufacturer", "model", "battery_capacity"]) \
+                    .where_between("id", low, high) \
+                    .get_query()
+                cursor = factory.execute_query(connection, query, query_builder.get_params(), commit=False)
+                for row in cursor.fetchall():
+                    drone = self._row_to_drone(row)
+                    found[drone.drone_id] = drone
+                cursor.close()
+            except Exception as e:
+                logger.error(f"Error finding drones with IDs in [{low}, {high}): {str(e)}")
+                raise
+        self._report_missing_range(low, high, found)
+        return found
+
+    def page(self, cursor=None, size=100):
+        # Страница дронов в порядке id. cursor - токен из предыдущего вызова (None - первая страница).
+        # Возвращает (список Drone, токен следующей страницы или None, если страница последняя).
+        # Запрашивается size + 1 строка: лишняя строка показывает, что дальше есть данные
+        if size < 1:
+            raise ValueError(f"Page size must be at least 1, got {size}")
+        factory = self.factory.read_factory()
+        query_builder = factory.create_query_builder() \
+            .select("drones", ["id", "manufacturer", "model", "battery_capacity"]) \
+            .order_by("id") \
+            .limit(size + 1)
+        if cursor is not None:
+            query_builder.after(_decode_page_token(cursor, ["id"]))
+        query = query_builder.get_query()
+        with DBConnectionManager(factory) as connection:
+            try:
+                db_cursor = factory.execute_query(connection, query, query_builder.get_params(), commit=False)
+                drones = [self._row_to_drone(row) for row in db_cursor.fetchall()]
+                db_cursor.close()
+            except Exception as e:
+                logger.error(f"Error reading page of {size} drones: {str(e)}")
+                raise
+        if len(drones) <= size:
+            return drones, None
+        drones.pop()
+        return drones, _encode_page_token((drones[-1].drone_id,))
+
+    def iter_all(self, batch_size=1000):
+        # Генератор по всей таблице с постоянным расходом памяти: строки читаются порциями,
+        # а Drone создается только для строки, до которой дошла итерация.
+        # Соединение занято, пока генератор не исчерпан или не закрыт
+        factory = self.factory.read_factory()
+        query = factory.create_query_builder() \
+            .select("drones", ["id", "manufacturer", "model", "battery_capacity"]) \
+            .get_query()
+        with DBConnectionManager(factory) as connection:
+            cursor = factory.execute_stream(connection, query, batch_size=batch_size)
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield self._row_to_drone(row)
+            finally:
+                factory.close_stream(cursor)
+
+    def load_batch(self, batch_size=1000):
+        # Вся таблица в колоночном DroneBatch: строки курсора читаются порциями и сразу раскладываются по колонкам
+        factory = self.factory.read_factory()
+        batch = DroneBatch()
+        query = factory.create_query_builder() \
+            .select("drones", ["id", "manufacturer", "model", "battery_capacity"]) \
+            .get_query()
+        with DBConnectionManager(factory) as connection:
+            cursor = factory.execute_stream(connection, query, batch_size=batch_size)
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    batch.extend_rows(rows)
+            finally:
+                factory.close_stream(cursor)
+        return batch
+
+    @staticmethod
+    def _row_to_drone(row):
+        return Drone(row["id"], row["manufacturer"], row["model"], row["battery_capacity"])
+
+    @staticmethod
+    def _report_missing(drone_ids, found):
+        # Одна запись в логе на весь пакет, а не по строке на каждый id
+        missing = [drone_id for drone_id in drone_ids if drone_id not in found]
+        if missing:
+            logger.info(f"{len(missing)} drone(s) not found: {_format_id_ranges(missing)}")
+
+    @staticmethod
+    def _report_missing_range(low, high, found):
+        # Пропуски в [low, high) считаются по отсортированным найденным id: память и время
+        # зависят от числа найденных строк, а не от ширины диапазона
+        gaps = []
+        expected = low
+        for drone_id in sorted(found):
+            if drone_id > expected:
+                gaps.append([expected, drone_id - 1])
+            expected = drone_id + 1
+        if expected < high:
+            gaps.append([expected, high - 1])
+        missing = sum(last - first + 1 for first, last in gaps)
+        if missing:
+            logger.info(f"{missing} drone(s) not found: {_format_ranges(gaps)}")
 
     def insert_drone(self, drone):
+        self._begin_write()
         with DBConnectionManager(self.factory) as connection:
             try:
-                # Проверка на существование записи
-                if self._drone_exists(connection, drone):
-                    logger.info(f"Drone {drone.manufacturer} {drone.model} already exists in database.")
-                else:
-                    # Вставка новой записи
-                    query_builder = self.factory.create_query_builder()
-                    query = query_builder.insert("drones", ["manufacturer", "model", "battery_capacity"]).get_query()
-                    self.factory.execute_query(connection, query,
-                                               (drone.manufacturer, drone.model, drone.battery_capacity))
+                # Один запрос вместо SELECT + INSERT: дубликат отсекает уникальный индекс idx_drones_identity
+                columns = ["manufacturer", "model", "battery_capacity"]
+                query_builder = self.factory.create_query_builder()
+                query = query_builder.upsert("drones", columns, conflict_columns=columns).get_query()
+                cursor = self.factory.execute_query(connection, query,
+                                                    (drone.manufacturer, drone.model, drone.battery_capacity))
+                inserted = cursor.rowcount > 0
+                cursor.close()
+                if inserted:
+                    self._after_write()
                     logger.info(f"Drone {drone.manufacturer} {drone.model} inserted into database.")
+                else:
+                    logger.info(f"Drone {drone.manufacturer} {drone.model} already exists in database.")
             except Exception as e:
                 logger.error(f"Error inserting drone {drone.manufacturer} {drone.model}: {str(e)}")
                 raise
 
-    def _drone_exists(self, connection, drone):
-        query_builder = self.factory.create_query_builder()
+    def insert_many(self, drones, ignore_conflicts=False, with_ids=False):
+        # Массовая вставка в одной транзакции. ignore_conflicts=True заменяет предварительную
+        # проверку на INSERT OR IGNORE / INSERT IGNORE / ON CONFLICT DO NOTHING (нужен уникальный индекс).
+        # with_ids=True - id берутся из drone.drone_id, а не выдаются базой (ShardedDroneMapper)
+        started = time.perf_counter()
+        columns = ["manufacturer", "model", "battery_capacity"]
+        rows = list(dict.fromkeys((drone.manufacturer, drone.model, drone.battery_capacity) for drone in drones))
+        if with_ids:
+            columns = ["id"] + columns
+            rows = list(dict.fromkeys((drone.drone_id, drone.manufacturer, drone.model, drone.battery_capacity)
+                                      for drone in drones))
+        skipped = len(drones) - len(rows)  # Дубликаты внутри самого пакета
+        inserted = 0
+        self._begin_write()
+        with DBConnectionManager(self.factory) as connection:
+            try:
+                if not ignore_conflicts:
+                    identity = (lambda row: row[1:]) if with_ids else (lambda row: row)
+                    existing = self._existing_keys(connection, [identity(row) for row in rows])
+                    skipped += sum(1 for row in rows if identity(row) in existing)
+                    rows = [row for row in rows if identity(row) not in existing]
+                if self.factory.multirow_insert:
+                    chunk_size = max(1, min(1000, self.factory.max_query_params // len(columns)))
+                    for start in range(0, len(rows), chunk_size):
+                        chunk = rows[start:start + chunk_size]
+                        query = self.factory.create_query_builder() \
+                            .insert("drones", columns, rows=len(chunk), ignore_conflicts=ignore_conflicts) \
+                            .get_query()
+                        cursor = self.factory.execute_query(connection, query,
+                                                            [value for row in chunk for value in row], commit=False)
+                        inserted += cursor.rowcount
+                        cursor.close()
+                elif rows:
+                    query = self.factory.create_query_builder() \
+                        .insert("drones", columns, ignore_conflicts=ignore_conflicts) \
+                        .get_query()
+                    cursor = self.factory.execute_many(connection, query, rows, commit=False)
+                    inserted += cursor.rowcount
+                    cursor.close()
+                # Вся пачка фиксируется одним commit при возврате соединения (или в конце единицы работы)
+            except Exception as e:
+                logger.error(f"Error inserting batch of {len(drones)} drones: {str(e)}")
+                raise
+        skipped += len(rows) - inserted  # Строки, отброшенные СУБД как конфликтующие
+        if inserted:
+            self._after_write()
+        seconds = time.perf_counter() - started
+        result = {
+            "inserted": inserted,
+            "skipped": skipped,
+            "seconds": seconds,
+            "rows_per_sec": inserted / seconds if seconds else 0.0,
+        }
+        logger.info(f"Batch insert into drones: {result}")
+        return result
+
+    def _existing_keys(self, connection, rows):
+        # Ключи (manufacturer, model, battery_capacity) из пакета, уже присутствующие в таблице:
+        # поиск по полному ключу в уникальном индексе, порциями по ROW_KEYS_PER_QUERY ключей
+        columns = ["manufacturer", "model", "battery_capacity"]
+        chunk_size = max(1, min(ROW_KEYS_PER_QUERY, self.factory.max_query_params // len(columns)))
+        existing = set()
+        for start in range(0, len(rows), chunk_size):
+            query_builder = self.factory.create_query_builder()
+            query = query_builder.select("drones", columns) \
+                .where_in_rows(columns, rows[start:start + chunk_size]) \
+                .get_query()
+            cursor = self.factory.execute_query(connection, query, query_builder.get_params(), commit=False)
+            for result in cursor.fetchall():
+                existing.add((result["manufacturer"], result["model"], result["battery_capacity"]))
+            cursor.close()
+        return existing
+
+    def delete_many(self, drone_ids):
+        # Удаление по id порциями WHERE id IN (...), одной транзакцией
+        drone_ids = list(dict.fromkeys(drone_ids))
+        deleted = 0
+        self._begin_write()
+        with DBConnectionManager(self.factory) as connection:
+            try:
+                for start in range(0, len(drone_ids), self.factory.max_query_params):
+                    query_builder = self.factory.create_query_builder()
+                    query = query_builder.delete("drones") \
+                        .where_in("id", drone_ids[start:start + self.factory.max_query_params]) \
+                        .get_query()
+                    cursor = self.factory.execute_query(connection, query, query_builder.get_params(),
+                                                        commit=False)
+                    deleted += cursor.rowcount
+                    cursor.close()
+            except Exception as e:
+                logger.error(f"Error deleting {len(drone_ids)} drones: {str(e)}")
+                raise
+        for drone_id in drone_ids:
+            self.invalidate(drone_id)
+        if deleted:
+            self._after_write()
+        return deleted
+
+    def exists(self, drone):
+        factory = self.factory.read_factory()
+        with DBConnectionManager(factory) as connection:
+            return self._drone_exists(factory, connection, drone)
+
+    def _drone_exists(self, factory, connection, drone):
+        query_builder = factory.create_query_builder()
         check_query = query_builder.select("drones", ["id"]) \
-            .where("manufacturer = ? AND model = ? AND battery_capacity = ?") \
+            .where("manufacturer = ? AND model = ? AND battery_capacity = ?",
+                   drone.manufacturer, drone.model, drone.battery_capacity) \
+            .limit(1) \
             .get_query()
-        cursor = self.factory.execute_query(connection, check_query,
-                                            (drone.manufacturer, drone.model, drone.battery_capacity))
+        cursor = factory.execute_query(connection, check_query, query_builder.get_params(), commit=False)
         result = cursor.fetchone()
         cursor.close()
         return result is not None
 
 
-# Контекстный менеджер для управления соединениями с базой данных
+# Токен страницы для клиента непрозрачен: ключ последней строки в JSON, закодированный base64
+def _encode_page_token(last_key):
+    return base64.urlsafe_b64encode(json.dumps(list(last_key)).encode()).decode()
+
+
+def _decode_page_token(token, key_columns):
+    # Токен - JSON-список значений последнего ключа страницы, по одному на колонку ORDER BY (целые id)
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid page token: {token!r}") from e
+    if not isinstance(key, list) or len(key) != len(key_columns) \
+            or not all(isinstance(value, int) and not isinstance(value, bool) for value in key):
+        raise ValueError(f"Invalid page token: {token!r} does not hold a key for {', '.join(key_columns)}")
+    return tuple(key)
+
+
+# Сворачивает подряд идущие id в диапазоны: [4, 5, 6, 9] -> "4-6, 9"
+def _format_id_ranges(drone_ids):
+    ranges = []
+    for drone_id in sorted(drone_ids):
+        if ranges and drone_id == ranges[-1][1] + 1:
+            ranges[-1][1] = drone_id
+        else:
+            ranges.append([drone_id, drone_id])
+    return _format_ranges(ranges)
+
+
+def _format_ranges(ranges):
+    return ", ".join(str(low) if low == high else f"{low}-{high}" for low, high in ranges)
+
+
+def _stable_hash(value):
+    # hash() строк меняется от запуска к запуску, для распределения по шардам нужен постоянный
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+
+
+# Кольцо консистентного хеширования. У каждого шарда vnodes точек на кольце, ключ принадлежит
+# шарду первой точки по часовой стрелке. При добавлении шарда к нему переходят только ключи
+# дуг перед его точками (~1/N всех ключей), остальные ключи остаются на месте
+class ConsistentHashRing:
+    def __init__(self, nodes=(), vnodes=64):
+        self.vnodes = vnodes
+        self._points = []  # Отсортированные пары (точка, узел)
+        for node in nodes:
+            self.add_node(node)
+
+    def add_node(self, node):
+        for replica in range(self.vnodes):
+            bisect.insort(self._points, (_stable_hash(f"{node}#{replica}"), node))
+
+    def remove_node(self, node):
+        self._points = [point for point in self._points if point[1] != node]
+
+    def node_for(self, key):
+        if not self._points:
+            raise LookupError("Hash ring is empty")
+        index = bisect.bisect(self._points, (_stable_hash(key),))
+        return self._points[index % len(self._points)][1]
+
+    def nodes(self):
+        return sorted({node for _, node in self._points})
+
+    def copy(self):
+        ring = ConsistentHashRing(vnodes=self.vnodes)
+        ring._points = list(self._points)
+        return ring
+
+
+# Маппер поверх нескольких фабрик (шардов) с распределением дронов по id через ConsistentHashRing.
+# Id выдает не база (у каждого шарда свой автоинкремент), а маппер: для нового дрона это
+# 63-битный хеш (manufacturer, model, battery_capacity), поэтому повторная вставка того же дрона
+# попадает в тот же шард и отсекается его уникальным индексом.
+# Пакетные операции выполняются на шардах параллельно в пуле потоков
+class ShardedDroneMapper:
+    def __init__(self, shards, vnodes=64, max_workers=8, cache=None):
+        # shards - словарь {имя шарда: фабрика}
+        self.cache = cache
+        self.mappers = {name: DroneMapper(factory, cache=cache) for name, factory in shards.items()}
+        self.ring = ConsistentHashRing(self.mappers, vnodes=vnodes)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix="drone-shard")
+
+    @staticmethod
+    def drone_id_for(drone):
+        return _stable_hash((drone.manufacturer, drone.model, drone.battery_capacity)) & 0x7FFFFFFFFFFFFFFF
+
+    def shard_for(self, drone_id):
+        return self.ring.node_for(drone_id)
+
+    def find_by_id(self, drone_id):
+        return self.mappers[self.shard_for(drone_id)].find_by_id(drone_id)
+
+    def find_by_ids(self, drone_ids):
+        groups = self._group(drone_ids, lambda drone_id: drone_id)
+        found = {}
+        for result in self._scatter(lambda mapper, ids: mapper.find_by_ids(ids), groups):
+            found.update(result)
+        return found
+
+    def insert_drone(self, drone):
+        self.insert_many([drone])
+        return drone.drone_id
+
+    def insert_many(self, drones):
+        # Дубликаты отсекает уникальный индекс шарда, поэтому без предварительной проверки
+        for drone in drones:
+            if drone.drone_id is None:
+                drone.drone_id = self.drone_id_for(drone)
+        groups = self._group(drones, lambda drone: drone.drone_id)
+        results = self._scatter(lambda mapper, batch: mapper.insert_many(batch, ignore_conflicts=True,
+                                                                         with_ids=True), groups)
+        return {"inserted": sum(result["inserted"] for result in results),
+                "skipped": sum(result["skipped"] for result in results)}
+
+    def iter_all(self, batch_size=1000):
+        for name in self.ring.nodes():
+            yield from self.mappers[name].iter_all(batch_size)
+
+    def add_shard(self, name, factory):
+        # К новому шарду переезжают только дроны, чьи id теперь принадлежат его точкам на кольце.
+        # Строки сначала копируются, затем кольцо переключается и копии удаляются со старых шардов:
+        # до переключения чтение идет на старые шарды, где данные еще есть
+        if name in self.mappers:
+            raise ValueError(f"Shard {name} already exists")
+        ring = self.ring.copy()
+        ring.add_node(name)
+        mapper = DroneMapper(factory, cache=self.cache)
+        sources = list(self.mappers.values())
+        moves = self._scatter(
+            lambda source, _: [drone for drone in source.iter_all() if ring.node_for(drone.drone_id) == name],
+            dict.fromkeys(sources))
+        moved = [drone for drones in moves for drone in drones]
+        mapper.insert_many(moved, ignore_conflicts=True, with_ids=True)
+        self.mappers[name] = mapper
+        self.ring = ring
+        self._scatter(lambda source, ids: source.delete_many(ids),
+                      {source: [drone.drone_id for drone in drones] for source, drones in zip(sources, moves) if drones})
+        logger.info(f"Shard {name} added, {len(moved)} drone(s) moved")
+        return len(moved)
+
+    def remove_shard(self, name):
+        # Дроны удаляемого шарда расходятся по следующим за его точками шардам
+        ring = self.ring.copy()
+        ring.remove_node(name)
+        mapper = self.mappers[name]
+        drones = list(mapper.iter_all())
+        groups = collections.defaultdict(list)
+        for drone in drones:
+            groups[ring.node_for(drone.drone_id)].append(drone)
+        self._scatter(lambda target, batch: target.insert_many(batch, ignore_conflicts=True, with_ids=True),
+                      {self.mappers[target]: batch for target, batch in groups.items()})
+        self.ring = ring
+        del self.mappers[name]
+        logger.info(f"Shard {name} removed, {len(drones)} drone(s) moved")
+        return len(drones)
+
+    def shard_stats(self):
+        return {name: self.mappers[name].factory.pool.stats() for name in self.ring.nodes()}
+
+    def close(self):
+        self._executor.shutdown()
+        for mapper in self.mappers.values():
+            mapper.factory.pool.close_all()
+
+    def _group(self, items, key):
+        groups = collections.defaultdict(list)
+        for item in items:
+            groups[self.mappers[self.shard_for(key(item))]].append(item)
+        return groups
+
+    def _scatter(self, call, groups):
+        # Параллельный вызов call(маппер шарда, порция) для каждого шарда, результаты - в порядке groups
+        futures = [self._executor.submit(call, mapper, batch) for mapper, batch in groups.items()]
+        return [future.result() for future in futures]
+
+
+# Контекстный менеджер: берет соединение из пула фабрики и возвращает его обратно.
+# Внутри factory.transaction() отдает соединение единицы работы и транзакцией не управляет
 class DBConnectionManager:
     def __init__(self, factory):
         self.factory = factory
         self.connection = None
+        self._owned = False
 
     def __enter__(self):
-        self.connection = self.factory.create_connection()
+        unit_of_work = self.factory.current_unit_of_work()
+        if unit_of_work is not None:
+            self.connection = unit_of_work.connection
+            self._owned = False
+        else:
+            self.connection = self.factory.pool.acquire()
+            self._owned = True
         return self.connection
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.connection:
-            self.connection.close()
-            logger.info(f"Connection closed for {type(self.factory).__name__} database.")
+        if self.connection and self._owned:
+            # Не возвращаем в пул соединение с незавершенной транзакцией:
+            # отложенные изменения фиксируются, при ошибке - откатываются
+            try:
+                if exc_type is None:
+                    self.connection.commit()
+                else:
+                    self.connection.rollback()
+            except Exception:
+                self.factory.pool.release(self.connection, discard=True)
+                self.connection = None
+                if exc_type is None:
+                    raise
+                return False
+            self.factory.pool.release(self.connection)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Connection returned to pool for %s database.", type(self.factory).__name__)
+        self.connection = None
+
+
+# DDL таблицы drones для каждой СУБД. Уникальный индекс по (manufacturer, model, battery_capacity)
+# создается отдельно (IDENTITY_INDEX_QUERIES), чтобы он появился и в таблицах, созданных без него
+# 64-битный id нужен для id, которые выдает ShardedDroneMapper (в SQLite INTEGER и так 64-битный)
+CREATE_TABLES_QUERIES = {
+    "sqlite": [
+        """
+        CREATE TABLE IF NOT EXISTS drones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            manufacturer VARCHAR(100),
+            model VARCHAR(100),
+            battery_capacity VARCHAR(100)
+        );
+        """,
+    ],
+    "mysql": [
+        """
+        CREATE TABLE IF NOT EXISTS drones (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            manufacturer VARCHAR(100),
+            model VARCHAR(100),
+            battery_capacity VARCHAR(100)
+        );
+        """,
+    ],
+    "postgresql": [
+        """
+        CREATE TABLE IF NOT EXISTS drones (
+            id BIGSERIAL PRIMARY KEY,
+            manufacturer VARCHAR(100),
+            model VARCHAR(100),
+            battery_capacity VARCHAR(100)
+        );
+        """,
+    ],
+}
+
+# Миграция на уникальный индекс idx_drones_identity: он превращает проверку на дубликат в поиск
+# по индексу и нужен для upsert в insert_drone. Если индекса еще нет, сначала удаляются дубликаты
+# (остается строка с наименьшим id; строки с NULL в ключе индекс не ограничивает), затем индекс создается.
+# В MySQL подзапрос по той же таблице в DELETE допустим только через производную таблицу
+_KEEP_FIRST_DUPLICATE = """
+    DELETE FROM drones
+    WHERE manufacturer IS NOT NULL AND model IS NOT NULL AND battery_capacity IS NOT NULL
+      AND id NOT IN ({kept_ids})
+"""
+_FIRST_IDS = """
+    SELECT MIN(id) AS id FROM drones
+    WHERE manufacturer IS NOT NULL AND model IS NOT NULL AND battery_capacity IS NOT NULL
+    GROUP BY manufacturer, model, battery_capacity
+"""
+IDENTITY_INDEX_QUERIES = {
+    "sqlite": {
+        "exists": "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_drones_identity'",
+        "deduplicate": _KEEP_FIRST_DUPLICATE.format(kept_ids=_FIRST_IDS),
+        "create": "CREATE UNIQUE INDEX idx_drones_identity ON drones (manufacturer, model, battery_capacity)",
+    },
+    "mysql": {
+        "exists": "SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() "
+                  "AND table_name = 'drones' AND index_name = 'idx_drones_identity' LIMIT 1",
+        "deduplicate": _KEEP_FIRST_DUPLICATE.format(kept_ids=f"SELECT id FROM ({_FIRST_IDS}) AS kept"),
+        "create": "CREATE UNIQUE INDEX idx_drones_identity ON drones (manufacturer, model, battery_capacity)",
+    },
+    "postgresql": {
+        "exists": "SELECT 1 FROM pg_indexes WHERE schemaname = current_schema() "
+                  "AND tablename = 'drones' AND indexname = 'idx_drones_identity'",
+        "deduplicate": _KEEP_FIRST_DUPLICATE.format(kept_ids=_FIRST_IDS),
+        "create": "CREATE UNIQUE INDEX idx_drones_identity ON drones (manufacturer, model, battery_capacity)",
+    },
+}
 
 
 # Создает таблицы, используя контекстный менеджер для управления соединениями.
+# Ошибка пробрасывается: без таблицы и уникального индекса маппер работать не сможет
 def create_tables(factory):
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS drones (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        manufacturer VARCHAR(100),
-        model VARCHAR(100),
-        battery_capacity VARCHAR(100)
-    );
-    """
     with DBConnectionManager(factory) as connection:
         try:
             cursor = connection.cursor()
-            cursor.execute(create_table_query)
+            for create_table_query in CREATE_TABLES_QUERIES[factory.db_type]:
+                cursor.execute(create_table_query)
             connection.commit()
             cursor.close()
             logger.info(f"Table 'drones' created or already exists in {type(factory).__name__} database.")
+            create_identity_index(connection, factory.db_type)
         except Exception as e:
+            connection.rollback()
             logger.error(f"Failed to create table in {type(factory).__name__} database: {e}")
+            raise
+
+
+def create_identity_index(connection, db_type):
+    queries = IDENTITY_INDEX_QUERIES[db_type]
+    cursor = connection.cursor()
+    try:
+        cursor.execute(queries["exists"])
+        if cursor.fetchone() is not None:
+            return
+        cursor.execute(queries["deduplicate"])
+        if cursor.rowcount > 0:
+            logger.warning(f"Removed {cursor.rowcount} duplicate drone(s) before creating idx_drones_identity.")
+        cursor.execute(queries["create"])
+        connection.commit()
+        logger.info("Unique index idx_drones_identity created on drones.")
+    finally:
+        cursor.close()
 
 
 # Создает таблицы, затем создает `DroneMapper` и ищет дрона с ID 1.
@@ -267,15 +2029,14 @@ def main():
         Drone(None, "Parrot", "Anafi", "2700 mAh")
     ]
 
-    for drone in drones:
-        drone_mapper.insert_drone(drone)
+    drone_mapper.insert_many(drones)
 
-    for drone_id in range(1, 100):
-        found_drone = drone_mapper.find_by_id(drone_id)
-        if found_drone:
-            logger.info(f"Found drone: {found_drone}")
-        else:
-            logger.info(f"Drone with ID {drone_id} not found.")
+    for found_drone in drone_mapper.find_range(1, 100).values():
+        logger.info(f"Found drone: {found_drone}")
+
+    logger.info(f"Connection pool stats: {factory.pool.stats()}")
+    logger.info(f"Query cache stats: {query_cache.stats()}")
+    factory.pool.close_all()
 
 
 if __name__ == "__main__":
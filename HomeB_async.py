@@ -0,0 +1,450 @@
+import abc
+import asyncio
+import itertools
+import logging
+import re
+import aiomysql
+import asyncpg
+
+from HomeB import (
+    SQLiteFactory,
+    LRUCache,
+    QueryBuilder,
+    Drone,
+    CREATE_TABLES_QUERIES,
+    IDENTITY_INDEX_QUERIES,
+)
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Асинхронная абстрактная фабрика: те же роли, что у AbstractFactory в HomeB.py, но все операции - корутины
+class AsyncAbstractFactory(abc.ABC):
+    db_type = None
+    max_query_params = 999
+
+    def create_query_builder(self):
+        # Построитель и кэш текстов запросов общие с синхронной версией
+        return QueryBuilder(self.db_type)
+
+    def connection(self):
+        # async with factory.connection() as connection: ...
+        return AsyncDBConnectionManager(self)
+
+    @abc.abstractmethod
+    async def acquire(self):
+        pass
+
+    @abc.abstractmethod
+    async def release(self, connection, discard=False):
+        pass
+
+    @abc.abstractmethod
+    async def fetch(self, connection, query, params=None):
+        pass
+
+    @abc.abstractmethod
+    async def execute(self, connection, query, params=None):
+        pass
+
+    @abc.abstractmethod
+    async def execute_many(self, connection, query, rows):
+        pass
+
+    @abc.abstractmethod
+    async def commit(self, connection):
+        pass
+
+    @abc.abstractmethod
+    async def rollback(self, connection):
+        pass
+
+    @abc.abstractmethod
+    async def close(self):
+        pass
+
+
+# SQLite не имеет асинхронного протокола: запросы выполняются в потоках через пул синхронной фабрики
+class AsyncSQLiteFactory(AsyncAbstractFactory):
+    db_type = "sqlite"
+
+    def __init__(self, database="sqlite_test_db.db", **pool_options):
+        self.sync_factory = SQLiteFactory(database, **pool_options)
+        self.max_query_params = self.sync_factory.max_query_params
+        # Ожидание свободного соединения - в цикле событий, а не в потоке: иначе ждущие потоки
+        # займут весь пул потоков и держателям соединений не на чем будет выполнить запрос
+        self._slots = asyncio.Semaphore(self.sync_factory.pool.max_size)
+
+    async def acquire(self):
+        await self._slots.acquire()
+        try:
+            return await asyncio.to_thread(self.sync_factory.pool.acquire)
+        except Exception:
+            self._slots.release()
+            raise
+
+    async def release(self, connection, discard=False):
+        self.sync_factory.pool.release(connection, discard=discard)
+        self._slots.release()
+
+    async def fetch(self, connection, query, params=None):
+        return await asyncio.to_thread(self._fetch, connection, query, params)
+
+    async def execute(self, connection, query, params=None):
+        return await asyncio.to_thread(self._execute, connection, query, params)
+
+    async def execute_many(self, connection, query, rows):
+        return await asyncio.to_thread(self._execute_many, connection, query, rows)
+
+    async def commit(self, connection):
+        await asyncio.to_thread(connection.commit)
+
+    async def rollback(self, connection):
+        await asyncio.to_thread(connection.rollback)
+
+    async def close(self):
+        self.sync_factory.pool.close_all()
+
+    def _fetch(self, connection, query, params):
+        cursor = self.sync_factory.execute_query(connection, query, params, commit=False)
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _execute(self, connection, query, params):
+        cursor = self.sync_factory.execute_query(connection, query, params, commit=False)
+        rowcount = cursor.rowcount
+        cursor.close()
+        return rowcount
+
+    def _execute_many(self, connection, query, rows):
+        cursor = self.sync_factory.execute_many(connection, query, rows, commit=False)
+        rowcount = cursor.rowcount
+        cursor.close()
+        return rowcount
+
+
+class AsyncPostgreSQLFactory(AsyncAbstractFactory):
+    db_type = "postgresql"
+    max_query_params = 10000
+
+    def __init__(self, pool_size=10, statement_cache_size=256):
+        self.pool_size = pool_size
+        self.statement_cache_size = statement_cache_size  # asyncpg сам готовит и кэширует запросы
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+        self._transactions = {}  # id(соединения) -> открытая транзакция asyncpg
+        self._queries = LRUCache(max_size=256)  # Запрос с %s -> запрос с $1, $2, ...
+
+    async def acquire(self):
+        pool = await self._get_pool()
+        connection = await pool.acquire()
+        # asyncpg работает в режиме автокоммита, транзакцию открываем явно, как psycopg2
+        transaction = connection.transaction()
+        await transaction.start()
+        self._transactions[id(connection)] = transaction
+        return connection
+
+    async def release(self, connection, discard=False):
+        transaction = self._transactions.pop(id(connection), None)
+        if transaction is not None and not discard:
+            await transaction.rollback()  # Транзакция не была завершена явно
+        if discard:
+            connection.terminate()
+        await self._pool.release(connection)
+
+    async def fetch(self, connection, query, params=None):
+        try:
+            return await connection.fetch(self._translate(query), *(params or ()))
+        except asyncpg.PostgresError as e:
+            logger.error(f"Error executing PostgreSQL query: {e}")
+            raise
+
+    async def execute(self, connection, query, params=None):
+        try:
+            status = await connection.execute(self._translate(query), *(params or ()))
+        except asyncpg.PostgresError as e:
+            logger.error(f"Error executing PostgreSQL query: {e}")
+            raise
+        # Статус вида "INSERT 0 5" - число строк в последнем поле
+        return int(status.split()[-1]) if status.split()[-1].isdigit() else -1
+
+    async def execute_many(self, connection, query, rows):
+        try:
+            await connection.executemany(self._translate(query), rows)
+        except asyncpg.PostgresError as e:
+            logger.error(f"Error executing PostgreSQL batch query: {e}")
+            raise
+        return -1  # asyncpg не сообщает число строк для executemany
+
+    async def commit(self, connection):
+        await self._finish(connection, commit=True)
+
+    async def rollback(self, connection):
+        await self._finish(connection, commit=False)
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def _get_pool(self):
+        async with self._pool_lock:
+            if self._pool is None:
+                self._pool = await asyncpg.create_pool(
+                    host="localhost",
+                    user="PostgreSQL_username",
+                    password="PostgreSQL_password",
+                    database="PostgreSQL_db",
+                    port=5432,  # PostgreSQL стандартный порт
+                    min_size=1,
+                    max_size=self.pool_size,
+                    statement_cache_size=self.statement_cache_size
+                )
+                logger.info("PostgreSQL async pool created.")
+        return self._pool
+
+    async def _finish(self, connection, commit):
+        transaction = self._transactions.pop(id(connection), None)
+        if transaction is None:
+            return
+        if commit:
+            await transaction.commit()
+        else:
+            await transaction.rollback()
+
+    def _translate(self, query):
+        # QueryBuilder генерирует %s (как для psycopg2), asyncpg ожидает $1, $2, ...
+        translated = self._queries.get(query)
+        if translated is None:
+            # Удвоенный для psycopg2 %% возвращается к %: asyncpg текст не форматирует
+            numbered = itertools.count(1)
+            translated = re.sub(r"%%|%s", lambda match: "%" if match.group() == "%%" else f"${next(numbered)}",
+                                query)
+            self._queries.put(query, translated)
+        return translated
+
+
+class AsyncMySQLFactory(AsyncAbstractFactory):
+    db_type = "mysql"
+    max_query_params = 65535
+
+    def __init__(self, pool_size=10):
+        self.pool_size = pool_size
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+
+    async def acquire(self):
+        pool = await self._get_pool()
+        return await pool.acquire()
+
+    async def release(self, connection, discard=False):
+        if discard:
+            connection.close()
+        self._pool.release(connection)
+
+    async def fetch(self, connection, query, params=None):
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            try:
+                await cursor.execute(*self._format_style(query, params))
+                return await cursor.fetchall()
+            except aiomysql.Error as e:
+                logger.error(f"Error executing MySQL query: {e}")
+                raise
+
+    async def execute(self, connection, query, params=None):
+        async with connection.cursor() as cursor:
+            try:
+                await cursor.execute(*self._format_style(query, params))
+                return cursor.rowcount
+            except aiomysql.Error as e:
+                logger.error(f"Error executing MySQL query: {e}")
+                raise
+
+    async def execute_many(self, connection, query, rows):
+        async with connection.cursor() as cursor:
+            try:
+                await cursor.executemany(self._format_style(query, rows)[0], rows)  # aiomysql склеивает INSERT в один многострочный
+                return cursor.rowcount
+            except aiomysql.Error as e:
+                logger.error(f"Error executing MySQL batch query: {e}")
+                raise
+
+    async def commit(self, connection):
+        await connection.commit()
+
+    async def rollback(self, connection):
+        await connection.rollback()
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    @staticmethod
+    def _format_style(query, params):
+        # aiomysql (pymysql) с параметрами форматирует текст через %. Текст QueryBuilder для MySQL
+        # рассчитан на mysql.connector, который подставляет только %s, поэтому остальные % удваиваются.
+        # Без параметров текст не форматируется и передается как есть
+        if not params:
+            return query, None
+        return re.sub(r"%(?!s)", "%%", query), params
+
+    async def _get_pool(self):
+        async with self._pool_lock:
+            if self._pool is None:
+                self._pool = await aiomysql.create_pool(
+                    host="localhost",
+                    user="MySQL_username",
+                    password="MySQL_password",
+                    db="MySQL_db",
+                    port=3306,  # MySQL стандартный порт
+                    minsize=1,
+                    maxsize=self.pool_size,
+                    autocommit=False
+                )
+                logger.info("MySQL async pool created.")
+        return self._pool
+
+
+# Асинхронный контекстный менеджер: соединение из пула, commit при выходе без ошибок, иначе rollback
+class AsyncDBConnectionManager:
+    def __init__(self, factory):
+        self.factory = factory
+        self.connection = None
+
+    async def __aenter__(self):
+        self.connection = await self.factory.acquire()
+        return self.connection
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                await self.factory.commit(self.connection)
+            else:
+                await self.factory.rollback(self.connection)
+        except Exception:
+            await self.factory.release(self.connection, discard=True)
+            self.connection = None
+            if exc_type is None:
+                raise
+            return False
+        await self.factory.release(self.connection)
+        self.connection = None
+        return False
+
+
+# Асинхронный аналог DroneMapper: параллельные запросы не блокируют цикл событий
+class AsyncDroneMapper:
+    columns = ["id", "manufacturer", "model", "battery_capacity"]
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    async def find_by_id(self, drone_id):
+        query_builder = self.factory.create_query_builder()
+        query = query_builder.select("drones", self.columns) \
+            .where_in("id", [drone_id]) \
+            .get_query()
+        async with self.factory.connection() as connection:
+            rows = await self.factory.fetch(connection, query, query_builder.get_params())
+        if rows:
+            return self._row_to_drone(rows[0])
+        logger.info("Drone with ID %s not found.", drone_id)
+        return None
+
+    async def find_by_ids(self, drone_ids):
+        # Порции id запрашиваются параллельно, каждая на своем соединении из пула
+        drone_ids = list(dict.fromkeys(drone_ids))
+        chunk_size = self.factory.max_query_params
+        chunks = [drone_ids[start:start + chunk_size] for start in range(0, len(drone_ids), chunk_size)]
+        found = {}
+        for rows in await asyncio.gather(*(self._fetch_chunk(chunk) for chunk in chunks)):
+            for row in rows:
+                drone = self._row_to_drone(row)
+                found[drone.drone_id] = drone
+        missing = len(drone_ids) - len(found)
+        if missing:
+            logger.info(f"{missing} drone(s) not found.")
+        return found
+
+    async def insert_many(self, drones):
+        # Дубликаты отсекает уникальный индекс idx_drones_identity (см. create_tables)
+        columns = ["manufacturer", "model", "battery_capacity"]
+        rows = list(dict.fromkeys((drone.manufacturer, drone.model, drone.battery_capacity) for drone in drones))
+        inserted = 0
+        async with self.factory.connection() as connection:
+            if self.factory.db_type == "sqlite":
+                query = self.factory.create_query_builder() \
+                    .insert("drones", columns, ignore_conflicts=True) \
+                    .get_query()
+                inserted = await self.factory.execute_many(connection, query, rows)
+            else:
+                chunk_size = max(1, min(1000, self.factory.max_query_params // len(columns)))
+                for start in range(0, len(rows), chunk_size):
+                    chunk = rows[start:start + chunk_size]
+                    query = self.factory.create_query_builder() \
+                        .insert("drones", columns, rows=len(chunk), ignore_conflicts=True) \
+                        .get_query()
+                    inserted += await self.factory.execute(connection, query,
+                                                           [value for row in chunk for value in row])
+        result = {"inserted": inserted, "skipped": len(drones) - inserted}
+        logger.info(f"Async batch insert into drones: {result}")
+        return result
+
+    async def _fetch_chunk(self, chunk):
+        query_builder = self.factory.create_query_builder()
+        query = query_builder.select("drones", self.columns) \
+            .where_in("id", chunk) \
+            .get_query()
+        async with self.factory.connection() as connection:
+            return await self.factory.fetch(connection, query, query_builder.get_params())
+
+    @staticmethod
+    def _row_to_drone(row):
+        return Drone(row["id"], row["manufacturer"], row["model"], row["battery_capacity"])
+
+
+# Создает таблицы и уникальный индекс (тот же DDL и та же миграция, что и в HomeB.create_tables)
+async def create_tables(factory):
+    async with factory.connection() as connection:
+        for create_table_query in CREATE_TABLES_QUERIES[factory.db_type]:
+            await factory.execute(connection, create_table_query)
+    logger.info(f"Table 'drones' created or already exists in {type(factory).__name__} database.")
+    queries = IDENTITY_INDEX_QUERIES[factory.db_type]
+    async with factory.connection() as connection:
+        if await factory.fetch(connection, queries["exists"]):
+            return
+        removed = await factory.execute(connection, queries["deduplicate"])
+        if removed > 0:
+            logger.warning(f"Removed {removed} duplicate drone(s) before creating idx_drones_identity.")
+        await factory.execute(connection, queries["create"])
+    logger.info("Unique index idx_drones_identity created on drones.")
+
+
+# Вставляет дронов и выполняет сотню одновременных поисков по ID
+async def main():
+    factory = AsyncSQLiteFactory()
+    await create_tables(factory)
+    drone_mapper = AsyncDroneMapper(factory)
+
+    await drone_mapper.insert_many([
+        Drone(None, "DJI", "Mavic Pro", "3830 mAh"),
+        Drone(None, "Rafael", "Harop", "12000 mAh"),
+        Drone(None, "Parrot", "Anafi", "2700 mAh")
+    ])
+
+    found_drones = await asyncio.gather(*(drone_mapper.find_by_id(drone_id) for drone_id in range(1, 100)))
+    for found_drone in found_drones:
+        if found_drone:
+            logger.info(f"Found drone: {found_drone}")
+
+    await factory.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
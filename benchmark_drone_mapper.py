@@ -0,0 +1,337 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from HomeB import (
+    SQLiteFactory,
+    MySQLFactory,
+    PostgreSQLFactory,
+    DroneMapper,
+    Drone,
+    DroneBatch,
+    DBConnectionManager,
+    create_tables,
+)
+from sqlite_profiles import SQLITE_PROFILES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+DEFAULT_BACKENDS = ["sqlite-file", "sqlite-memory"]
+SEED_CHUNK = 100000  # Дронов на один вызов insert_many при заполнении таблицы
+
+
+# Новая база SQLite во временном каталоге
+def fresh_sqlite_factory(directory, name):
+    factory = SQLiteFactory(os.path.join(directory, name))
+    create_tables(factory)
+    return factory
+
+
+def make_drones(count, prefix="Model", start=0):
+    return [Drone(None, f"Manufacturer {i % 100}", f"{prefix} {i}", f"{1000 + i % 5000} mAh")
+            for i in range(start, start + count)]
+
+
+# Фабрика с пустой таблицей drones для каждого бэкенда. Для PostgreSQL и MySQL используются
+# локальные базы из настроек фабрик HomeB.py - таблица drones в них пересоздается
+def make_factory(backend, directory, size, profile=None):
+    if backend == "sqlite-file":
+        factory = SQLiteFactory(os.path.join(directory, f"bench_{size}_{profile or 'default'}.db"), profile=profile)
+    elif backend == "sqlite-memory":
+        factory = SQLiteFactory(f"file:bench_{size}_{os.getpid()}?mode=memory&cache=shared")
+    elif backend == "postgresql":
+        factory = PostgreSQLFactory()
+    elif backend == "mysql":
+        factory = MySQLFactory()
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+    if backend in ("postgresql", "mysql"):
+        with DBConnectionManager(factory) as connection:
+            cursor = connection.cursor()
+            cursor.execute("DROP TABLE IF EXISTS drones")
+            cursor.close()
+    create_tables(factory)
+    return factory
+
+
+def _latency_result(operation, durations, count=None):
+    durations = sorted(durations)
+    total = sum(durations)
+    count = len(durations) if count is None else count
+    return {
+        "operation": operation,
+        "count": count,
+        "ops_per_sec": count / total if total else 0.0,
+        "p50_ms": durations[len(durations) // 2] * 1000,
+        "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000,
+    }
+
+
+def _timed(operation, count, function):
+    started = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - started
+    return {"operation": operation, "count": count, "ops_per_sec": count / seconds if seconds else 0.0,
+            "seconds": seconds}
+
+
+# Заполнение таблицы: это же замер массовой загрузки (insert_many)
+def benchmark_bulk_load(mapper, size):
+    started = time.perf_counter()
+    for start in range(0, size, SEED_CHUNK):
+        mapper.insert_many(make_drones(min(SEED_CHUNK, size - start), start=start), ignore_conflicts=True)
+    seconds = time.perf_counter() - started
+    return {"operation": "bulk_load", "count": size, "ops_per_sec": size / seconds, "seconds": seconds}
+
+
+def benchmark_find_by_id(mapper, size, lookups):
+    rng = random.Random(size)
+    durations = []
+    for _ in range(lookups):
+        drone_id = rng.randint(1, size)
+        started = time.perf_counter()
+        mapper.find_by_id(drone_id)
+        durations.append(time.perf_counter() - started)
+    return _latency_result("find_by_id", durations)
+
+
+def benchmark_exists(mapper, size, lookups):
+    # Половина проверок - существующие дроны, половина - отсутствующие
+    rng = random.Random(size + 1)
+    existing = make_drones(1, start=rng.randrange(size))[0]
+    missing = Drone(None, "Nobody", "Nothing", "0 mAh")
+    durations = []
+    for index in range(lookups):
+        started = time.perf_counter()
+        mapper.exists(existing if index % 2 else missing)
+        durations.append(time.perf_counter() - started)
+    return _latency_result("exists", durations)
+
+
+def benchmark_insert_drone(mapper, size, inserts):
+    durations = []
+    for drone in make_drones(inserts, prefix="Extra", start=size):
+        started = time.perf_counter()
+        mapper.insert_drone(drone)
+        durations.append(time.perf_counter() - started)
+    return _latency_result("insert_drone", durations)
+
+
+# Небольшие пакеты через путь по умолчанию (проверка дубликатов перед вставкой, без ignore_conflicts):
+# половина дронов пакета уже есть в таблице
+def benchmark_insert_many_checked(mapper, size, batches=50, batch_size=10):
+    durations = []
+    for batch in range(batches):
+        start = size + batch * batch_size
+        drones = make_drones(batch_size // 2, start=batch * batch_size) + \
+            make_drones(batch_size - batch_size // 2, prefix="Checked", start=start)
+        started = time.perf_counter()
+        mapper.insert_many(drones)
+        durations.append(time.perf_counter() - started)
+    return _latency_result("insert_many_checked", durations)
+
+
+def benchmark_full_scan(mapper, size):
+    return _timed("full_scan", size, lambda: sum(1 for _ in mapper.iter_all(batch_size=1000)))
+
+
+def benchmark_load_batch(mapper, size):
+    return _timed("load_batch", size, lambda: mapper.load_batch(batch_size=1000))
+
+
+# Обход всей таблицы страницами page(): при keyset-пагинации время страницы не зависит от ее номера,
+# поэтому p95 близок к p50 даже на миллионе строк
+def benchmark_page(mapper, size, page_size=100):
+    durations = []
+    token = None
+    while True:
+        started = time.perf_counter()
+        _, token = mapper.page(token, page_size)
+        durations.append(time.perf_counter() - started)
+        if token is None:
+            break
+    return _latency_result("page", durations)
+
+
+# Полный прогон операций маппера на одном бэкенде и одном размере таблицы
+def run_suite(backend, size, directory, lookups=2000, inserts=500, profile=None):
+    factory = make_factory(backend, directory, size, profile)
+    mapper = DroneMapper(factory)
+    results = [
+        benchmark_bulk_load(mapper, size),
+        benchmark_find_by_id(mapper, size, lookups),
+        benchmark_exists(mapper, size, lookups),
+        benchmark_insert_drone(mapper, size, inserts),
+        benchmark_insert_many_checked(mapper, size),
+        benchmark_full_scan(mapper, size + inserts),
+        benchmark_load_batch(mapper, size + inserts),
+        benchmark_page(mapper, size + inserts),
+    ]
+    factory.pool.close_all()
+    for result in results:
+        result.update(backend=backend, profile=profile, size=size)
+        logger.info(f"{backend} {profile or 'default':<11} {size:>8} {result['operation']:<13} "
+                    f"{result['ops_per_sec']:>12.0f} ops/sec")
+    return results
+
+
+# Вставка по одному дрону: commit после каждого запроса против одного commit на блок factory.transaction()
+def benchmark_commit_modes(count=2000):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        factory = fresh_sqlite_factory(directory, "per_statement.db")
+        mapper = DroneMapper(factory)
+        started = time.perf_counter()
+        for drone in make_drones(count):
+            mapper.insert_drone(drone)
+        results["per_statement_commit"] = count / (time.perf_counter() - started)
+        factory.pool.close_all()
+
+        factory = fresh_sqlite_factory(directory, "batched.db")
+        mapper = DroneMapper(factory)
+        started = time.perf_counter()
+        with factory.transaction():
+            for drone in make_drones(count):
+                mapper.insert_drone(drone)
+        results["batched_commit"] = count / (time.perf_counter() - started)
+        factory.pool.close_all()
+
+        factory = fresh_sqlite_factory(directory, "mapper_autocommit_off.db")
+        mapper = DroneMapper(factory, autocommit=False)
+        started = time.perf_counter()
+        for drone in make_drones(count):
+            mapper.insert_drone(drone)
+        mapper.commit()
+        results["autocommit_off"] = count / (time.perf_counter() - started)
+        factory.pool.close_all()
+    return results
+
+
+# Прежний Drone с __dict__ - для сравнения расхода памяти
+class DictDrone:
+    def __init__(self, drone_id, manufacturer, model, battery_capacity):
+        self.drone_id = drone_id
+        self.manufacturer = manufacturer
+        self.model = model
+        self.battery_capacity = battery_capacity
+
+
+def _bytes_per_record(build, count):
+    # Строки таблицы генерируются до замера: считаем только память самого контейнера
+    rows = [(i, f"Manufacturer {i % 100}", f"Model {i % 1000}", f"{1000 + i % 5000} mAh") for i in range(count)]
+    tracemalloc.start()
+    container = build(rows)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del container
+    return used / count
+
+
+def _build_batch(rows):
+    batch = DroneBatch()
+    for row in rows:
+        batch.append(*row)
+    return batch
+
+
+# Память на одну запись: объекты с __dict__, объекты со __slots__ и колоночный DroneBatch
+def benchmark_memory_per_record(count=100000):
+    return {
+        "dict_drone": _bytes_per_record(lambda rows: [DictDrone(*row) for row in rows], count),
+        "slots_drone": _bytes_per_record(lambda rows: [Drone(*row) for row in rows], count),
+        "drone_batch": _bytes_per_record(_build_batch, count),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _result_key(result):
+    return result["backend"], result.get("profile"), result["size"], result["operation"]
+
+
+# Сравнение с результатами прошлого прогона: отношение ops/sec по каждой комбинации
+# (бэкенд, профиль SQLite, размер, операция)
+def compare_results(previous, current, tolerance=0.1):
+    previous_results = {_result_key(r): r for r in previous["results"]}
+    regressions = []
+    for result in current["results"]:
+        key = _result_key(result)
+        if key not in previous_results or not previous_results[key]["ops_per_sec"]:
+            continue
+        ratio = result["ops_per_sec"] / previous_results[key]["ops_per_sec"]
+        logger.info(f"{key[0]} {key[1] or 'default':<11} {key[2]:>8} {key[3]:<13} x{ratio:.2f} "
+                    f"vs {str(previous.get('commit'))[:8]}")
+        if ratio < 1 - tolerance:
+            regressions.append((key, ratio))
+    for key, ratio in regressions:
+        logger.warning(f"Regression: {key} is at {ratio:.0%} of the previous throughput")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the DroneMapper data layer")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--backends", nargs="+", default=DEFAULT_BACKENDS,
+                        choices=["sqlite-file", "sqlite-memory", "postgresql", "mysql"])
+    # Профили PRAGMA для sqlite-file: каждый профиль - отдельный прогон, "default" - настройки SQLite
+    parser.add_argument("--sqlite-profiles", nargs="+", default=["default"],
+                        choices=["default", *SQLITE_PROFILES])
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--inserts", type=int, default=500)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="JSON file from an earlier run")
+    args = parser.parse_args()
+
+    # Логи каждого запроса на уровне INFO исказили бы замеры
+    logging.getLogger("HomeB").setLevel(logging.WARNING)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in args.backends:
+            profiles = args.sqlite_profiles if backend == "sqlite-file" else ["default"]
+            for profile in profiles:
+                profile = None if profile == "default" else profile
+                for size in args.sizes:
+                    report["results"].extend(run_suite(backend, size, directory, args.lookups, args.inserts,
+                                                       profile))
+    report["commit_modes"] = benchmark_commit_modes()
+    report["memory_per_record"] = benchmark_memory_per_record()
+    for mode, statements_per_sec in report["commit_modes"].items():
+        logger.info(f"{mode}: {statements_per_sec:.0f} statements/sec")
+    for container, bytes_per_record in report["memory_per_record"].items():
+        logger.info(f"{container}: {bytes_per_record:.1f} bytes/record")
+
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    logger.info(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as previous:
+            compare_results(json.load(previous), report)
+
+
+if __name__ == "__main__":
+    main()
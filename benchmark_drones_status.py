@@ -0,0 +1,128 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from drones_status_migrations import migrate, latest_status_per_drone, status_in_window, flying_in_bbox
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CREATE_STATUS_TABLE = """
+CREATE TABLE tbl_drones_status (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT UNIQUE NOT NULL,
+    drone_ID INTEGER NOT NULL,
+    status_id INTEGER NOT NULL,
+    mission_id INTEGER NOT NULL,
+    operator_id INTEGER NOT NULL,
+    status_update_time DATETIME NOT NULL,
+    battery_level INTEGER NOT NULL,
+    latitude REAL,
+    longitude REAL,
+    altitude REAL,
+    direction REAL,
+    is_flying BOOLEAN
+)
+"""
+
+# Прежний запрос "последний статус": GROUP BY по всей таблице
+LATEST_STATUS_GROUP_BY = """
+SELECT status.* FROM tbl_drones_status AS status
+JOIN (SELECT drone_ID, MAX(status_update_time) AS latest FROM tbl_drones_status GROUP BY drone_ID) AS last
+ON status.drone_ID = last.drone_ID AND status.status_update_time = last.latest
+"""
+
+START_TIME = datetime.datetime(2024, 1, 1)
+
+
+# Статусы дронов: каждый дрон отчитывается раз в секунду, координаты - вокруг Москвы
+def generate_statuses(rows, drones, seed=1):
+    rng = random.Random(seed)
+    for index in range(rows):
+        moment = START_TIME + datetime.timedelta(seconds=index // drones)
+        yield (f"status-{index}", index % drones + 1, 1, 1, 1, moment.strftime("%Y-%m-%d %H:%M:%S"),
+               rng.randint(0, 100), 55.0 + rng.random(), 37.0 + rng.random(), rng.uniform(0, 500),
+               rng.uniform(0, 360), rng.random() < 0.5)
+
+
+def seed_status_table(connection, rows, drones, chunk=100000):
+    connection.execute(CREATE_STATUS_TABLE)
+    statuses = generate_statuses(rows, drones)
+    started = time.perf_counter()
+    for _ in range(0, rows, chunk):
+        connection.executemany(
+            "INSERT INTO tbl_drones_status (name, drone_ID, status_id, mission_id, operator_id, status_update_time, "
+            "battery_level, latitude, longitude, altitude, direction, is_flying) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (row for _, row in zip(range(chunk), statuses)))
+        connection.commit()
+    return time.perf_counter() - started
+
+
+def _time_query(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - started)
+    return min(durations) * 1000, len(result)
+
+
+def measure_queries(connection, rows, drones, repeat, with_indexes):
+    # Окно в одну минуту в середине истории и квадрат 0.01 x 0.01 градуса
+    middle = START_TIME + datetime.timedelta(seconds=rows // drones // 2)
+    window = (middle.strftime("%Y-%m-%d %H:%M:%S"),
+              (middle + datetime.timedelta(minutes=1)).strftime("%Y-%m-%d %H:%M:%S"))
+    queries = {
+        "latest_status_group_by": lambda: connection.execute(LATEST_STATUS_GROUP_BY).fetchall(),
+        "status_in_window": lambda: status_in_window(connection, *window),
+        "status_in_window_one_drone": lambda: status_in_window(connection, *window, drone_id=drones // 2),
+        "flying_in_bbox": lambda: flying_in_bbox(connection, 55.5, 55.51, 37.5, 37.51),
+    }
+    if with_indexes:
+        # Без индекса рекурсивный запрос делал бы полный проход по таблице на каждый дрон
+        queries["latest_status_per_drone"] = lambda: latest_status_per_drone(connection)
+    results = {}
+    for name, function in queries.items():
+        milliseconds, count = _time_query(function, repeat)
+        results[name] = {"ms": milliseconds, "rows": count}
+        logger.info(f"{'indexed' if with_indexes else 'no index':>8} {name:<28} {milliseconds:>10.1f} ms "
+                    f"({count} rows)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for tbl_drones_status queries before and after indexing")
+    parser.add_argument("--rows", type=int, default=10000000)
+    parser.add_argument("--drones", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="bench_drones_status.json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection = sqlite3.connect(os.path.join(directory, "status.db"))
+        seed_seconds = seed_status_table(connection, args.rows, args.drones)
+        logger.info(f"Seeded {args.rows} statuses in {seed_seconds:.1f} s")
+        before = measure_queries(connection, args.rows, args.drones, args.repeat, with_indexes=False)
+        started = time.perf_counter()
+        migrate(connection)
+        index_seconds = time.perf_counter() - started
+        logger.info(f"Migrations applied in {index_seconds:.1f} s")
+        after = measure_queries(connection, args.rows, args.drones, args.repeat, with_indexes=True)
+        connection.close()
+
+    report = {"rows": args.rows, "drones": args.drones, "sqlite": sqlite3.sqlite_version,
+              "seed_seconds": seed_seconds, "index_seconds": index_seconds, "before": before, "after": after}
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    logger.info(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import importlib
+import json
+import logging
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+# Имена модулей сервера и клиента содержат кириллическую "с" (practiсe)
+server = importlib.import_module("practiсe_3_2_server_Egor")
+client = importlib.import_module("practiсe_3_2_client_Egor")
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Сервер Flask в фоновом потоке на свободном порту: замеры идут через настоящий HTTP
+def start_server():
+    http_server = make_server("127.0.0.1", 0, server.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    return http_server, f"http://127.0.0.1:{http_server.server_port}/"
+
+
+def samples(count):
+    started = time.time()
+    return [(started + index * 0.02, 55.75 + index * 1e-6, 37.61, 100.0) for index in range(count)]
+
+
+# Прежний путь: POST /telemetry с одним JSON-образцом (keep-alive сессия, чтобы мерить разбор, а не TCP)
+def benchmark_single(url, count):
+    drone_client = client.DroneClient(url)
+    started = time.perf_counter()
+    for timestamp, latitude, longitude, altitude in samples(count):
+        drone_client.send_telemetry(latitude, longitude, altitude, "single", timestamp).raise_for_status()
+    seconds = time.perf_counter() - started
+    drone_client.close()
+    return count / seconds
+
+
+def benchmark_batch(url, count, fmt, batch_size):
+    sender = client.BufferedTelemetrySender(url, drone_id=f"batch-{fmt}", max_samples=batch_size, fmt=fmt)
+    started = time.perf_counter()
+    for timestamp, latitude, longitude, altitude in samples(count):
+        sender.add(latitude, longitude, altitude, timestamp)
+    sender.close()
+    seconds = time.perf_counter() - started
+    return sender.sent / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telemetry ingestion: single-sample POST vs /telemetry/batch")
+    parser.add_argument("--single", type=int, default=2000, help="Samples for the single-sample path")
+    parser.add_argument("--batched", type=int, default=100000, help="Samples for each batch format")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--output", default="bench_telemetry_ingest.json")
+    args = parser.parse_args()
+
+    # Журнал запросов werkzeug на каждый POST исказил бы замер
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    http_server, url = start_server()
+    results = {"single_json": benchmark_single(url, args.single)}
+    for fmt in ("ndjson", "msgpack", "struct"):
+        results[f"batch_{fmt}"] = benchmark_batch(url, args.batched, fmt, args.batch_size)
+    http_server.shutdown()
+
+    for path, samples_per_sec in results.items():
+        logger.info(f"{path:<14} {samples_per_sec:>12.0f} samples/sec "
+                    f"(x{samples_per_sec / results['single_json']:.1f})")
+    with open(args.output, "w") as output:
+        json.dump({"batch_size": args.batch_size, "samples_per_sec": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
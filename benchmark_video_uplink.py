@@ -0,0 +1,87 @@
+import argparse
+import importlib
+import json
+import logging
+import threading
+import time
+
+import cv2
+from werkzeug.serving import make_server
+
+# Имена модулей сервера и клиента содержат кириллическую "с" (practiсe)
+server = importlib.import_module("practiсe_3_2_server_Egor")
+client = importlib.import_module("practiсe_3_2_client_Egor")
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def start_server(network_delay):
+    # network_delay - искусственная задержка ответа /video, имитирует медленный канал
+    app = server.app
+    if network_delay:
+        receive_video = app.view_functions["receive_video"]
+
+        def delayed_receive_video():
+            time.sleep(network_delay)
+            return receive_video()
+        app.view_functions["receive_video"] = delayed_receive_video
+    http_server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    return http_server, f"http://127.0.0.1:{http_server.server_port}/"
+
+
+# Прежний цикл: прочитать, закодировать, отправить и ждать 1/fps - все последовательно
+def benchmark_serial(url, args):
+    source = client.SyntheticFrameSource(args.width, args.height)
+    drone_client = client.DroneClient(url)
+    sent = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.duration:
+        ret, frame = source.read()
+        _, buffer = cv2.imencode('.jpg', frame)
+        if drone_client.send_jpeg(buffer.tobytes()).status_code == 204:
+            sent += 1
+        time.sleep(1 / args.fps)
+    elapsed = time.perf_counter() - started
+    drone_client.close()
+    return {"sent": sent, "elapsed_sec": elapsed, "sent_fps": sent / elapsed}
+
+
+def benchmark_pipelined(url, args):
+    source = client.SyntheticFrameSource(args.width, args.height)
+    with client.DroneClient(url) as drone_client:
+        uplink = client.VideoUplink(drone_client, source, fps=args.fps, queue_size=args.queue_size).start()
+        time.sleep(args.duration)
+        uplink.stop()
+        return uplink.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Video uplink: serial post-per-frame loop vs pipelined VideoUplink")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run")
+    parser.add_argument("--fps", type=float, default=60)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--queue-size", type=int, default=2)
+    parser.add_argument("--network-delay", type=float, default=0.0, help="Extra server latency per frame, seconds")
+    parser.add_argument("--output", default="bench_video_uplink.json")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    http_server, url = start_server(args.network_delay)
+    results = {"serial": benchmark_serial(url, args), "pipelined": benchmark_pipelined(url, args)}
+    http_server.shutdown()
+
+    for mode, stats in results.items():
+        logger.info(f"{mode:<10} {stats['sent_fps']:>7.1f} fps sent ({stats['sent']} frames in "
+                    f"{stats['elapsed_sec']:.1f} s)")
+    pipelined = results["pipelined"]
+    logger.info(f"pipelined: captured {pipelined['captured']}, dropped {pipelined['dropped_before_encode']} "
+                f"before encode and {pipelined['dropped_before_send']} before send")
+    with open(args.output, "w") as output:
+        json.dump({"fps": args.fps, "network_delay": args.network_delay, "results": results}, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
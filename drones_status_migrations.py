@@ -0,0 +1,116 @@
+import logging
+import sqlite3
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Миграции схемы телеметрии tbl_drones_status (SQLite). Номер примененной миграции хранится
+# в PRAGMA user_version, поэтому migrate() можно вызывать при каждом запуске
+def _add_is_flying(connection):
+    # Из-за пропущенной запятой в practice_2_12.py колонка is_flying не создавалась:
+    # "direction REAL is_flying BOOLEAN" - это одна колонка direction с типом "REAL is_flying BOOLEAN"
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(tbl_drones_status)")}
+    if "is_flying" not in columns:
+        connection.execute("ALTER TABLE tbl_drones_status ADD COLUMN is_flying BOOLEAN")
+
+
+MIGRATIONS = [
+    (1, "add missing is_flying column", [_add_is_flying]),
+    # "Последний статус дрона" и "статусы дрона за период": поиск по drone_ID и диапазону времени
+    (2, "index status by drone and time", [
+        "CREATE INDEX IF NOT EXISTS idx_drones_status_drone_time "
+        "ON tbl_drones_status (drone_ID, status_update_time)",
+    ]),
+    # "Все статусы за период" без фильтра по дрону
+    (3, "index status by time", [
+        "CREATE INDEX IF NOT EXISTS idx_drones_status_time ON tbl_drones_status (status_update_time)",
+    ]),
+    # Поиск в прямоугольнике: диапазон по latitude сужается индексом, longitude проверяется по записи индекса
+    (4, "index status by position", [
+        "CREATE INDEX IF NOT EXISTS idx_drones_status_position ON tbl_drones_status (latitude, longitude)",
+    ]),
+    # Статистика для планировщика: без нее SQLite может выбрать не тот из нескольких индексов
+    (5, "analyze", ["ANALYZE tbl_drones_status"]),
+]
+
+
+def schema_version(connection):
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(connection, target=None):
+    # Применяет миграции с номером больше текущей версии схемы, каждую в своей транзакции.
+    # Модуль sqlite3 сам открывает транзакцию только перед INSERT/UPDATE/DELETE, а DDL и
+    # PRAGMA user_version без явного BEGIN выполнялись бы в автокоммите и не откатывались
+    target = MIGRATIONS[-1][0] if target is None else target
+    current = schema_version(connection)
+    for version, description, steps in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        try:
+            if not connection.in_transaction:
+                connection.execute("BEGIN")
+            for step in steps:
+                if callable(step):
+                    step(connection)
+                else:
+                    connection.execute(step)
+            connection.execute(f"PRAGMA user_version = {version}")
+            connection.commit()
+        except sqlite3.Error as e:
+            connection.rollback()
+            logger.error(f"Migration {version} ({description}) failed: {e}")
+            raise
+        logger.info(f"Migration {version} applied: {description}")
+    return schema_version(connection)
+
+
+# Последний статус каждого дрона. GROUP BY drone_ID прочитал бы весь индекс, поэтому
+# id дронов перебираются рекурсивным запросом "следующий drone_ID больше текущего"
+# (по одному поиску в индексе на дрон), а последний статус берется через ORDER BY ... LIMIT 1
+# по индексу idx_drones_status_drone_time. Стоимость растет с числом дронов, а не строк
+LATEST_STATUS_QUERY = """
+WITH RECURSIVE drone_ids(drone_id) AS (
+    SELECT MIN(drone_ID) FROM tbl_drones_status
+    UNION ALL
+    SELECT (SELECT MIN(drone_ID) FROM tbl_drones_status WHERE drone_ID > drone_ids.drone_id)
+    FROM drone_ids WHERE drone_ids.drone_id IS NOT NULL
+)
+SELECT status.*
+FROM drone_ids
+JOIN tbl_drones_status AS status ON status.id = (
+    SELECT id FROM tbl_drones_status
+    WHERE drone_ID = drone_ids.drone_id
+    ORDER BY status_update_time DESC
+    LIMIT 1
+)
+"""
+
+
+def latest_status_per_drone(connection):
+    return connection.execute(LATEST_STATUS_QUERY).fetchall()
+
+
+def status_in_window(connection, start, end, drone_id=None):
+    # Статусы за полуоткрытый интервал [start, end)
+    if drone_id is None:
+        return connection.execute(
+            "SELECT * FROM tbl_drones_status WHERE status_update_time >= ? AND status_update_time < ? "
+            "ORDER BY status_update_time", (start, end)).fetchall()
+    return connection.execute(
+        "SELECT * FROM tbl_drones_status WHERE drone_ID = ? AND status_update_time >= ? AND status_update_time < ? "
+        "ORDER BY status_update_time", (drone_id, start, end)).fetchall()
+
+
+def flying_in_bbox(connection, lat_min, lat_max, lon_min, lon_max):
+    return connection.execute(
+        "SELECT * FROM tbl_drones_status WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ? "
+        "AND is_flying = 1", (lat_min, lat_max, lon_min, lon_max)).fetchall()
+
+
+if __name__ == "__main__":
+    connection = sqlite3.connect('test.db')
+    logger.info(f"Schema version: {migrate(connection)}")
+    connection.close()
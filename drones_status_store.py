@@ -0,0 +1,332 @@
+import abc
+import collections
+import datetime
+import glob
+import logging
+import os
+import sqlite3
+
+import psycopg2
+import psycopg2.extras
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Колонки истории статусов (как в tbl_drones_status без id и name: имя статуса не может быть
+# уникальным сразу во всех секциях). Строки для append_batch передаются кортежами в этом порядке
+STATUS_COLUMNS = ("drone_ID", "status_id", "mission_id", "operator_id", "status_update_time", "battery_level",
+                  "latitude", "longitude", "altitude", "direction", "is_flying")
+TIME_INDEX = STATUS_COLUMNS.index("status_update_time")
+
+
+def _day(value):
+    # День секции для datetime/date или строки "YYYY-MM-DD[ HH:MM:SS]"
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+def _days(start, end):
+    # Дни, пересекающиеся с полуоткрытым интервалом [start, end)
+    day, last = _day(start), _day(end)
+    if str(end)[11:].strip("0:.") == "":
+        last -= datetime.timedelta(days=1)  # Полночь конца интервала в него не входит
+    while day <= last:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+def _group_by_day(statuses):
+    groups = collections.defaultdict(list)
+    for status in statuses:
+        groups[_day(status[TIME_INDEX])].append(status)
+    return sorted(groups.items())
+
+
+# Хранилище истории статусов дронов с секциями по дням. Запрос за период читает только
+# секции нужных дней, а старый день отключается или уходит в архив без переписывания данных
+class StatusStore(abc.ABC):
+    @abc.abstractmethod
+    def append_batch(self, statuses):
+        pass
+
+    @abc.abstractmethod
+    def query_range(self, start, end, drone_id=None):
+        pass
+
+    @abc.abstractmethod
+    def partitions(self):
+        pass
+
+    @abc.abstractmethod
+    def detach_partition(self, day):
+        pass
+
+    @abc.abstractmethod
+    def drop_partition(self, day):
+        pass
+
+
+# SQLite: каждый день - отдельный файл базы, подключаемый через ATTACH. Одновременно подключено
+# не больше max_attached дней (у SQLite лимит 10 по умолчанию), давно не использованные отключаются
+class SQLiteStatusStore(StatusStore):
+    def __init__(self, directory, max_attached=8):
+        self.directory = directory
+        self.max_attached = max_attached
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(":memory:")
+        self._attached = collections.OrderedDict()  # день -> имя схемы, в порядке использования
+
+    def partition_path(self, day):
+        return os.path.join(self.directory, f"status_{day.isoformat()}.db")
+
+    def append_batch(self, statuses):
+        # Каждый день фиксируется своим commit: DETACH внутри транзакции невозможен.
+        # В отключенный день писать нельзя (как в PostgreSQL, где для него нет секции):
+        # проверка идет до первой вставки, чтобы пакет не записался частично
+        groups = _group_by_day(statuses)
+        for day, _ in groups:
+            if os.path.exists(self.detached_path(day)):
+                raise ValueError(f"Status partition {day} is detached, statuses for it cannot be appended")
+        count = 0
+        for day, rows in groups:
+            schema = self._attach(day, create=True)
+            columns = ", ".join(STATUS_COLUMNS)
+            placeholders = ", ".join("?" for _ in STATUS_COLUMNS)
+            try:
+                self.connection.executemany(
+                    f"INSERT INTO {schema}.tbl_drones_status ({columns}) VALUES ({placeholders})", rows)
+                self.connection.commit()
+            except sqlite3.Error as e:
+                self.connection.rollback()
+                logger.error(f"Error appending {len(rows)} statuses to partition {day}: {e}")
+                raise
+            count += len(rows)
+        return count
+
+    def query_range(self, start, end, drone_id=None):
+        # Секции перебираются по дням по возрастанию, поэтому результат упорядочен по времени
+        columns = ", ".join(STATUS_COLUMNS)
+        condition = "status_update_time >= ? AND status_update_time < ?"
+        params = [str(start), str(end)]
+        if drone_id is not None:
+            condition = "drone_ID = ? AND " + condition
+            params.insert(0, drone_id)
+        rows = []
+        for day in _days(start, end):
+            if not os.path.exists(self.partition_path(day)):
+                continue
+            schema = self._attach(day)
+            rows.extend(self.connection.execute(
+                f"SELECT {columns} FROM {schema}.tbl_drones_status WHERE {condition} "
+                f"ORDER BY status_update_time", params))
+        return rows
+
+    def partitions(self):
+        paths = glob.glob(os.path.join(self.directory, "status_*.db"))
+        return sorted(datetime.date.fromisoformat(os.path.basename(path)[7:17]) for path in paths)
+
+    def detached_path(self, day):
+        return os.path.join(self.directory, "detached", os.path.basename(self.partition_path(day)))
+
+    def detach_partition(self, day):
+        # Как DETACH PARTITION в PostgreSQL: данные дня сохраняются, но пропадают из partitions()
+        # и query_range. Файл секции переносится в подкаталог detached/ (переименование, без копирования)
+        self._detach(day)
+        detached = self.detached_path(day)
+        os.makedirs(os.path.dirname(detached), exist_ok=True)
+        _move_new(self.partition_path(day), detached)
+        logger.info(f"Status partition {day} detached to {detached}")
+        return detached
+
+    def archive_partition(self, day, archive_directory):
+        # Перенос файла секции (подключенной или отключенной) - переименование, а не копирование строк
+        self._detach(day)
+        os.makedirs(archive_directory, exist_ok=True)
+        archived = os.path.join(archive_directory, os.path.basename(self.partition_path(day)))
+        _move_new(self._existing_path(day), archived)
+        logger.info(f"Status partition {day} archived to {archived}")
+        return archived
+
+    def drop_partition(self, day):
+        self._detach(day)
+        os.remove(self._existing_path(day))
+        logger.info(f"Status partition {day} dropped")
+
+    def close(self):
+        self.connection.close()
+        self._attached.clear()
+
+    def _detach(self, day):
+        # Отключает файл дня от соединения (ATTACH), файл остается на месте
+        schema = self._attached.pop(day, None)
+        if schema is not None:
+            self.connection.execute(f"DETACH DATABASE {schema}")
+
+    def _existing_path(self, day):
+        path = self.partition_path(day)
+        return path if os.path.exists(path) else self.detached_path(day)
+
+    def _attach(self, day, create=False):
+        schema = self._attached.get(day)
+        if schema is not None:
+            self._attached.move_to_end(day)
+            return schema
+        while len(self._attached) >= self.max_attached:
+            _, oldest = self._attached.popitem(last=False)
+            self.connection.execute(f"DETACH DATABASE {oldest}")
+        schema = f"p_{day.strftime('%Y%m%d')}"
+        self.connection.execute("ATTACH DATABASE ? AS " + schema, (self.partition_path(day),))
+        self._attached[day] = schema
+        if create:
+            self.connection.executescript(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.tbl_drones_status (
+                drone_ID INTEGER NOT NULL,
+                status_id INTEGER NOT NULL,
+                mission_id INTEGER NOT NULL,
+                operator_id INTEGER NOT NULL,
+                status_update_time DATETIME NOT NULL,
+                battery_level INTEGER NOT NULL,
+                latitude REAL,
+                longitude REAL,
+                altitude REAL,
+                direction REAL,
+                is_flying BOOLEAN
+            );
+            CREATE INDEX IF NOT EXISTS {schema}.idx_drones_status_drone_time
+                ON tbl_drones_status (drone_ID, status_update_time);
+            CREATE INDEX IF NOT EXISTS {schema}.idx_drones_status_time ON tbl_drones_status (status_update_time);
+            """)
+        return schema
+
+
+# Перенос файла без перезаписи: существующий файл назначения (отключенная или архивная копия дня)
+# не затирается, а вызывает FileExistsError. os.link атомарно отказывает, если имя занято
+def _move_new(source, destination):
+    os.link(source, destination)
+    os.remove(source)
+
+
+# PostgreSQL: декларативное секционирование PARTITION BY RANGE по времени статуса.
+# Секции дней создаются при первой вставке, отсечение лишних секций делает планировщик,
+# DETACH PARTITION и DROP TABLE меняют только метаданные
+class PostgreSQLStatusStore(StatusStore):
+    table = "tbl_drones_status_history"
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._known_days = set()
+        cursor = self.connection.cursor()
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {self.table} (
+            drone_ID INTEGER NOT NULL,
+            status_id INTEGER NOT NULL,
+            mission_id INTEGER NOT NULL,
+            operator_id INTEGER NOT NULL,
+            status_update_time TIMESTAMP NOT NULL,
+            battery_level INTEGER NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            altitude REAL,
+            direction REAL,
+            is_flying BOOLEAN
+        ) PARTITION BY RANGE (status_update_time)
+        """)
+        # Индекс на секционированной таблице создается и во всех ее секциях (PostgreSQL 11+)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_drone_time "
+                       f"ON {self.table} (drone_ID, status_update_time)")
+        self.connection.commit()
+        cursor.close()
+
+    def partition_name(self, day):
+        return f"{self.table}_{day.strftime('%Y%m%d')}"
+
+    def append_batch(self, statuses):
+        groups = _group_by_day(statuses)
+        cursor = self.connection.cursor()
+        try:
+            for day, _ in groups:
+                self._ensure_partition(cursor, day)
+            columns = ", ".join(STATUS_COLUMNS)
+            # Вставка через родительскую таблицу: строки раскладываются по секциям сервером
+            psycopg2.extras.execute_values(cursor, f"INSERT INTO {self.table} ({columns}) VALUES %s",
+                                           [row for _, rows in groups for row in rows], page_size=1000)
+            self.connection.commit()
+        except psycopg2.Error as e:
+            self.connection.rollback()
+            self._known_days.difference_update(day for day, _ in groups)
+            logger.error(f"Error appending statuses: {e}")
+            raise
+        finally:
+            cursor.close()
+        return sum(len(rows) for _, rows in groups)
+
+    def query_range(self, start, end, drone_id=None):
+        columns = ", ".join(STATUS_COLUMNS)
+        condition = "status_update_time >= %s AND status_update_time < %s"
+        params = [start, end]
+        if drone_id is not None:
+            condition = "drone_ID = %s AND " + condition
+            params.insert(0, drone_id)
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(f"SELECT {columns} FROM {self.table} WHERE {condition} ORDER BY status_update_time",
+                           params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def partitions(self):
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute("SELECT child.relname FROM pg_inherits "
+                           "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+                           "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+                           "WHERE parent.relname = %s", (self.table,))
+            names = [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+        return sorted(datetime.datetime.strptime(name[-8:], "%Y%m%d").date() for name in names)
+
+    def detach_partition(self, day):
+        # Отключенная секция остается обычной таблицей: ее можно выгрузить pg_dump и удалить
+        self._execute_ddl(f"ALTER TABLE {self.table} DETACH PARTITION {self.partition_name(day)}")
+        self._known_days.discard(day)
+
+    def drop_partition(self, day):
+        self._execute_ddl(f"DROP TABLE IF EXISTS {self.partition_name(day)}")
+        self._known_days.discard(day)
+
+    def _ensure_partition(self, cursor, day):
+        if day in self._known_days:
+            return
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {self.partition_name(day)} PARTITION OF {self.table} "
+                       f"FOR VALUES FROM (%s) TO (%s)", (day, day + datetime.timedelta(days=1)))
+        self._known_days.add(day)
+
+    def _execute_ddl(self, query):
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(query)
+            self.connection.commit()
+        except psycopg2.Error as e:
+            self.connection.rollback()
+            logger.error(f"Error executing '{query}': {e}")
+            raise
+        finally:
+            cursor.close()
+
+
+if __name__ == "__main__":
+    store = SQLiteStatusStore("status_history")
+    moment = datetime.datetime(2024, 1, 1, 23, 59, 58)
+    statuses = [(drone_id, 1, 1, 1, (moment + datetime.timedelta(seconds=second)).strftime("%Y-%m-%d %H:%M:%S"),
+                 90, 55.75, 37.61, 120.0, 90.0, True) for second in range(4) for drone_id in (1, 2)]
+    logger.info(f"Appended {store.append_batch(statuses)} statuses")
+    logger.info(f"Partitions: {store.partitions()}")
+    for row in store.query_range("2024-01-01 23:59:59", "2024-01-02 00:00:01", drone_id=1):
+        logger.info(f"Status: {row}")
+    store.close()
@@ -123,8 +123,7 @@ if __name__ == "__main__":
     select_query = QueryBuilder()
     select_query = select_query.select("tbl_drones").get_query()
     cursor.execute(select_query)
-    results = cursor.fetchall()
-    for row in results:
+    for row in cursor:  # строки читаются по мере итерации, а не все сразу
         print(row)
 
     connection.close()
@@ -1,5 +1,7 @@
 import sqlite3
 
+from drones_status_migrations import migrate
+
 connection = sqlite3.connect('test.db')
 cursor = connection.cursor()
 
@@ -37,7 +39,7 @@ CREATE TABLE IF NOT EXISTS tbl_drones_status (
     latitude REAL,
     longitude REAL,
     altitude REAL,
-    direction REAL
+    direction REAL,
     is_flying BOOLEAN,
     FOREIGN KEY (drone_id) REFERENCES tbl_drones(id)
     FOREIGN KEY (status_id) REFERENCES tbl_status(id)
@@ -83,6 +85,8 @@ CREATE TABLE IF NOT EXISTS tbl_operators (
 )
 """)
 
+# Индексы телеметрии и исправления схемы для уже созданных баз
+migrate(connection)
 
 connection.commit()
 connection.close()
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 import sqlite3
 
+from sqlite_profiles import apply_profile
+
 
 # Паттерн Абстрактная фабрика для создания подключений к базе данных
 class DBFactory(ABC):
@@ -10,9 +12,15 @@ class DBFactory(ABC):
 
 
 class SQLiteDBFactory(DBFactory):
+    # profile - профиль PRAGMA из sqlite_profiles ("durable", "ingest", "read-mostly"), None - по умолчанию
+    def __init__(self, profile=None):
+        self.profile = profile
+
     # Реализация метода connect для SQLite, создающая подключение к базе данных в памяти
     def connect(self):
-        return sqlite3.connect('test.db')
+        connection = sqlite3.connect('test.db')
+        apply_profile(connection, self.profile)
+        return connection
 
 
 # Паттерн Строитель для создания SQL-запросов
@@ -115,7 +123,7 @@ class UserMapper:
 
 if __name__ == "__main__":
     # Создание объекта фабрики для SQLite и подключение к базе данных
-    sql = SQLiteDBFactory()
+    sql = SQLiteDBFactory(profile="durable")
     connection = sql.connect()
     cursor = connection.cursor()
 
@@ -161,10 +169,9 @@ if __name__ == "__main__":
     query_builder_select = QueryBuilder()
     select_query = query_builder_select.select("tbl_drones").get_query()
     cursor.execute(select_query)
-    results = cursor.fetchall()
 
-    # Вывод всех записей из таблицы
-    for row in results:
+    # Вывод всех записей из таблицы: курсор отдает строки по одной, без загрузки всей выборки
+    for row in cursor:
         print(row)
 
     connection.close()  # Закрытие подключения к базе данных
@@ -1,8 +1,10 @@
-import requests
-import json
+from practiсe_3_2_client_Egor import DroneClient
 
 base_url = 'http://127.0.0.1:5000'
 
-response = requests.post(f"{base_url}/drone/takeoff")
-print(f"Статус код: {response.status_code}")
-print(f"Ответ: {response.json()}")
\ No newline at end of file
+# Клиент с пулом keep-alive соединений и повторами при ошибках соединения
+with DroneClient(base_url) as client:
+    response = client.takeoff()
+    print(f"Статус код: {response.status_code}")
+    print(f"Ответ: {response.json()}")
+    print(f"Задержка: {client.latency_stats()}")
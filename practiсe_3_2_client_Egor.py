@@ -1,24 +1,407 @@
 import requests
 import cv2
 import json
+import struct
+import threading
 import time
+from collections import defaultdict, deque
+
+import msgpack
+import numpy as np
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 base_url = 'http://127.0.0.1:5000/'
 
 
-def send_telemetry(latitude, longitude, altitude):
-    json_data = {
-        'latitude': latitude,
-        'longitude': longitude,
-        'altitude': altitude
-    }
-    response = requests.post(f"{base_url}telemetry", json=json_data)
+# Клиент API дрона поверх одной requests.Session: соединения держатся открытыми (keep-alive)
+# в пуле на pool_size соединений вместо нового TCP-рукопожатия на каждый кадр и образец.
+# Повторы с экспоненциальной паузой (backoff_factor * 2^n) - на ошибки соединения и ответы 502/503/504.
+# Повтор после ошибки чтения отключен: POST мог уже дойти до сервера (повторный взлет вернет 400).
+# Время каждого запроса копится по эндпоинтам, сводка - latency_stats()
+class DroneClient:
+    def __init__(self, base_url=base_url, pool_size=10, retries=3, backoff_factor=0.1, timeout=5.0,
+                 latency_window=1000):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        retry = Retry(total=retries, connect=retries, read=0, status=retries, backoff_factor=backoff_factor,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET", "POST"}),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._latencies = defaultdict(lambda: deque(maxlen=latency_window))  # Последние замеры, секунды
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def takeoff(self):
+        return self.request("POST", "drone/takeoff")
+
+    def send_telemetry(self, latitude, longitude, altitude, drone_id=None, timestamp=None):
+        json_data = {
+            'latitude': latitude,
+            'longitude': longitude,
+            'altitude': altitude
+        }
+        if drone_id is not None:
+            json_data['drone_id'] = drone_id
+        if timestamp is not None:
+            json_data['timestamp'] = timestamp
+        return self.request("POST", "telemetry", json=json_data)
+
+    def send_telemetry_batch(self, body, content_type, drone_id="default"):
+        return self.request("POST", "telemetry/batch", data=body, params={"drone_id": drone_id},
+                            headers={"Content-Type": content_type})
+
+    def send_video(self, video_frame):
+        _, buffer = cv2.imencode('.jpg', video_frame)
+        return self.send_jpeg(buffer.tobytes())
+
+    def send_jpeg(self, jpeg):
+        return self.request("POST", "video", data=jpeg)
+
+    def display(self, drone_id="default", since=None, limit=None):
+        params = {"drone_id": drone_id}
+        if since is not None:
+            params["since"] = since
+        if limit is not None:
+            params["limit"] = limit
+        return self.request("GET", "display", params=params)
+
+    def request(self, method, endpoint, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        started = time.perf_counter()
+        try:
+            return self.session.request(method, f"{self.base_url}/{endpoint}", **kwargs)
+        finally:
+            # Замер включает повторы и паузы между ними - это задержка, которую видит вызывающий
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._latencies[endpoint].append(elapsed)
+                self._counts[endpoint] += 1
+
+    def latency_stats(self):
+        # {endpoint: {"count", "mean_ms", "p50_ms", "p95_ms", "max_ms"}}; перцентили - по последним
+        # latency_window замерам эндпоинта, count - по всем запросам
+        with self._lock:
+            snapshot = {endpoint: (sorted(samples), self._counts[endpoint])
+                        for endpoint, samples in self._latencies.items()}
+        stats = {}
+        for endpoint, (samples, count) in snapshot.items():
+            if not samples:
+                continue
+            stats[endpoint] = {
+                "count": count,
+                "mean_ms": sum(samples) / len(samples) * 1000,
+                "p50_ms": _percentile(samples, 50) * 1000,
+                "p95_ms": _percentile(samples, 95) * 1000,
+                "max_ms": samples[-1] * 1000,
+            }
+        return stats
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# Перцентиль по ближайшему рангу для отсортированного списка
+def _percentile(sorted_values, percent):
+    index = max(0, -(-len(sorted_values) * percent // 100) - 1)
+    return sorted_values[int(index)]
+
+
+def send_telemetry(latitude, longitude, altitude, client=None):
+    client = client or default_client()
+    response = client.send_telemetry(latitude, longitude, altitude)
     print(response.json())
 
 
-def send_video(video_frame):
-    _, buffer = cv2.imencode('.jpg', video_frame)
-    response = requests.post(f"{base_url}video", data=buffer.tobytes())
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+# Общий клиент модуля для функций send_telemetry/send_video: одно пуловое соединение на процесс
+def default_client():
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = DroneClient(base_url)
+        return _default_client
+
+
+# Накопитель телеметрии: образцы уходят на /telemetry/batch одним запросом, когда набралось
+# max_samples образцов или с первого неотправленного прошло max_delay секунд (проверяет фоновый поток).
+# fmt - "struct" (записи "<dddd"), "msgpack" или "ndjson". Запросы идут через DroneClient:
+# переданный client (его пул соединений и замеры задержки) или собственный на url
+class BufferedTelemetrySender:
+    RECORD = struct.Struct("<dddd")
+    CONTENT_TYPES = {
+        "struct": "application/octet-stream",
+        "msgpack": "application/msgpack",
+        "ndjson": "application/x-ndjson",
+    }
+
+    def __init__(self, url=base_url, drone_id="default", max_samples=500, max_delay=0.2, fmt="struct",
+                 client=None):
+        if fmt not in self.CONTENT_TYPES:
+            raise ValueError(f"Unknown telemetry batch format: {fmt}")
+        self._owns_client = client is None
+        self.client = client or DroneClient(url)
+        self.drone_id = drone_id
+        self.max_samples = max_samples
+        self.max_delay = max_delay
+        self.fmt = fmt
+        self.sent = 0
+        self.rejected = 0  # Образцы из пакетов, отклоненных сервером с ответом 4xx
+        self.last_error = None
+        self._samples = []
+        self._first_added = None
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flusher.start()
+
+    def add(self, latitude, longitude, altitude, timestamp=None):
+        with self._lock:
+            if not self._samples:
+                self._first_added = time.monotonic()
+            self._samples.append((time.time() if timestamp is None else timestamp, latitude, longitude, altitude))
+            full = len(self._samples) >= self.max_samples
+        if full:
+            self.flush()
+
+    def flush(self):
+        # Отправки идут строго по очереди: сервер не примет пакет старше уже полученного
+        with self._send_lock:
+            with self._lock:
+                samples, self._samples = self._samples, []
+            if not samples:
+                return 0
+            try:
+                response = self.client.send_telemetry_batch(self._encode(samples), self.CONTENT_TYPES[self.fmt],
+                                                            self.drone_id)
+            except requests.RequestException:
+                self._requeue(samples)
+                raise
+            if response.status_code >= 500:
+                self._requeue(samples)
+                response.raise_for_status()
+            if response.status_code >= 400:
+                # Пакет отклонен (например, образцы старше уже принятых): повтор получит тот же ответ,
+                # поэтому пакет отбрасывается, а ошибка видна в rejected и last_error
+                self.rejected += len(samples)
+                self.last_error = f"{response.status_code}: {response.text}"
+                print(f"Пакет телеметрии из {len(samples)} образцов отклонен сервером: {self.last_error}")
+                return 0
+            self.sent += len(samples)
+            return len(samples)
+
+    def _requeue(self, samples):
+        # Сбой связи или ошибка сервера: образцы уйдут со следующим пакетом
+        with self._lock:
+            self._samples = samples + self._samples
+
+    def close(self):
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        if self._owns_client:
+            self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _encode(self, samples):
+        if self.fmt == "struct":
+            return b"".join(self.RECORD.pack(*sample) for sample in samples)
+        records = [{"drone_id": self.drone_id, "timestamp": timestamp, "latitude": latitude,
+                    "longitude": longitude, "altitude": altitude}
+                   for timestamp, latitude, longitude, altitude in samples]
+        if self.fmt == "msgpack":
+            return msgpack.packb(records)
+        return "\n".join(json.dumps(record) for record in records).encode()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.max_delay / 4):
+            with self._lock:
+                due = self._samples and time.monotonic() - self._first_added >= self.max_delay
+            if due:
+                try:
+                    self.flush()
+                except requests.RequestException as e:
+                    print(f"Ошибка при отправке пакета телеметрии: {e}")
+
+
+# Ограниченная очередь между стадиями видеоканала: при переполнении выбрасывается самый старый
+# элемент - для видео важен свежий кадр, а не каждый кадр. get() после close() отдает остаток
+# и затем None - сигнал следующей стадии завершиться
+class DropOldestQueue:
+    def __init__(self, maxsize):
+        self._items = deque(maxlen=maxsize)
+        self._condition = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._condition:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1  # deque с maxlen сам вытолкнет старейший
+            self._items.append(item)
+            self._condition.notify()
+
+    def get(self):
+        with self._condition:
+            while not self._items and not self._closed:
+                self._condition.wait()
+            return self._items.popleft() if self._items else None
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+# Синтетический источник кадров с интерфейсом cv2.VideoCapture (read/isOpened/release):
+# шум с движущейся полосой, чтобы JPEG сжимался как живое видео. frames=None - бесконечно
+class SyntheticFrameSource:
+    def __init__(self, width=640, height=480, frames=None, seed=0):
+        self.frames = frames
+        self._count = 0
+        rng = np.random.default_rng(seed)
+        self._base = rng.integers(0, 64, size=(height, width, 3), dtype=np.uint8)
+
+    def read(self):
+        if self.frames is not None and self._count >= self.frames:
+            return False, None
+        frame = self._base.copy()
+        column = self._count * 8 % frame.shape[1]
+        frame[:, column:column + 32] = 255
+        self._count += 1
+        return True, frame
+
+    def isOpened(self):
+        return self.frames is None or self._count < self.frames
+
+    def release(self):
+        pass
+
+
+# Конвейерная отправка видео: захват, JPEG-кодирование и отправка идут в отдельных потоках и
+# связаны очередями DropOldestQueue. Медленная сеть не тормозит захват - устаревшие кадры
+# выбрасываются перед кодированием или перед отправкой. source - cv2.VideoCapture или любой
+# объект с read() -> (ret, frame); захват ограничен частотой fps (None - без ограничения)
+class VideoUplink:
+    def __init__(self, client, source, fps=60, quality=80, queue_size=2):
+        self.client = client
+        self.source = source
+        self.fps = fps
+        self.quality = quality
+        self._raw = DropOldestQueue(queue_size)
+        self._encoded = DropOldestQueue(queue_size)
+        self._stopped = threading.Event()
+        self._threads = [threading.Thread(target=target, daemon=True)
+                         for target in (self._capture, self._encode, self._send)]
+        self._counts = {"captured": 0, "encoded": 0, "sent": 0, "failed": 0}
+        self._started = None
+        self._finished = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        # Захват прекращается, кадры уже в очередях дорабатываются до конца
+        self._stopped.set()
+        self.join()
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def stats(self):
+        elapsed = ((self._finished or time.perf_counter()) - self._started) if self._started else 0.0
+        stats = dict(self._counts)
+        stats.update({
+            "elapsed_sec": elapsed,
+            "capture_fps": stats["captured"] / elapsed if elapsed else 0.0,
+            "sent_fps": stats["sent"] / elapsed if elapsed else 0.0,
+            "encode_queue_depth": len(self._raw),
+            "send_queue_depth": len(self._encoded),
+            "dropped_before_encode": self._raw.dropped,
+            "dropped_before_send": self._encoded.dropped,
+        })
+        return stats
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _capture(self):
+        period = 1 / self.fps if self.fps else 0.0
+        deadline = time.perf_counter()
+        try:
+            while not self._stopped.is_set():
+                ret, frame = self.source.read()
+                if not ret:
+                    break
+                self._counts["captured"] += 1
+                self._raw.put(frame)
+                # Пауза до следующего слота, а не фиксированные 1/fps после чтения кадра
+                deadline = max(deadline + period, time.perf_counter() - period)
+                delay = deadline - time.perf_counter()
+                if delay > 0:
+                    self._stopped.wait(delay)
+        finally:
+            self._raw.close()
+
+    def _encode(self):
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), self.quality]
+        try:
+            while (frame := self._raw.get()) is not None:
+                ok, buffer = cv2.imencode('.jpg', frame, params)
+                if ok:
+                    self._counts["encoded"] += 1
+                    self._encoded.put(buffer.tobytes())
+        finally:
+            self._encoded.close()
+
+    def _send(self):
+        try:
+            while (jpeg := self._encoded.get()) is not None:
+                try:
+                    response = self.client.send_jpeg(jpeg)
+                except requests.RequestException as e:
+                    print(f"Ошибка при отправке кадра: {e}")
+                    self._counts["failed"] += 1
+                    continue
+                self._counts["sent" if response.status_code == 204 else "failed"] += 1
+        finally:
+            self._finished = time.perf_counter()
+
+
+def send_video(video_frame, client=None):
+    client = client or default_client()
+    response = client.send_video(video_frame)
     if response.status_code == 204:
         print("Кадр успешно отправлен")
     else:
@@ -26,14 +409,21 @@ def send_video(video_frame):
 
 
 if __name__ == '__main__':
-    send_telemetry(55.5555, 37.7777, 100.0)
+    client = DroneClient(base_url)
+    send_telemetry(55.5555, 37.7777, 100.0, client)
     cap = cv2.VideoCapture(0)
-    fps = 60
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
-        send_video(frame)
-        time.sleep(1/fps)
+    uplink = VideoUplink(client, cap, fps=60).start()
+    try:
+        while uplink.is_running():
+            uplink.join(timeout=5)
+            stats = uplink.stats()
+            print(f"Видео: {stats['sent_fps']:.1f} кадр/с отправлено, {stats['capture_fps']:.1f} кадр/с захвачено, "
+                  f"очереди {stats['encode_queue_depth']}/{stats['send_queue_depth']}, "
+                  f"выброшено {stats['dropped_before_encode']}+{stats['dropped_before_send']}")
+    except KeyboardInterrupt:
+        uplink.stop()
     cap.release()
     cv2.destroyAllWindows()
+    for endpoint, stats in client.latency_stats().items():
+        print(f"{endpoint}: {stats['count']} запросов, p50 {stats['p50_ms']:.1f} мс, p95 {stats['p95_ms']:.1f} мс")
+    client.close()
@@ -1,7 +1,7 @@
 from flask import Flask, Response, request, jsonify
-import cv2
-import numpy as np
-import time
+
+from telemetry_buffer import TelemetryStore, parse_batch
+from video_broadcast import FrameBroadcaster
 
 app = Flask(__name__)
 drone_state = {
@@ -10,12 +10,15 @@ drone_state = {
         "latitude":  0.0,
         "longitude": 0.0,
         "altitude":  0.0
-    },
-    "telemetry_data": []
+    }
 }
-video_frame = None
+# История телеметрии по дронам: 30000 последних образцов на дрона (10 минут при 50 Гц, ~1 МБ)
+telemetry_store = TelemetryStore(capacity=30000)
+DISPLAY_MAX_LIMIT = 5000
 fps = 10
 quality = 80
+# Последний кадр, уже закодированный в JPEG, общий для всех зрителей /video_feed
+video_broadcaster = FrameBroadcaster(quality=quality)
 
 @app.route("/drone/takeoff", methods=["POST"])
 def takeoff():
@@ -39,34 +42,56 @@ def takeoff():
 @app.route("/telemetry", methods=["POST"])
 def receive_telemetry():
     data = request.json
-    drone_state["telemetry_data"].append(data)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Образец телеметрии должен быть JSON-объектом"}), 400
+    try:
+        telemetry_store.append(str(data.get("drone_id", "default")), data)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Некорректный образец телеметрии: {e}"}), 400
     return jsonify({"status": "Получили"}), 200
 
 
+# Пакет образцов одним запросом. Формат задается Content-Type:
+#   application/x-ndjson         - JSON-объект образца на строку;
+#   application/msgpack          - msgpack-массив словарей образцов;
+#   application/octet-stream     - записи "<dddd" (timestamp, latitude, longitude, altitude), drone_id в query
+@app.route("/telemetry/batch", methods=["POST"])
+def receive_telemetry_batch():
+    try:
+        batches = parse_batch(request.content_type, request.get_data(), request.args.get("drone_id", "default"))
+        for drone_id, samples in batches.items():
+            telemetry_store.extend(drone_id, samples)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Некорректный пакет телеметрии: {e}"}), 400
+    return jsonify({"status": "Получили", "accepted": sum(len(samples) for samples in batches.values())}), 200
+
+
+# /display?drone_id=...&since=<timestamp>&limit=<n>: образцы новее since (все хранимые, если since нет),
+# не больше limit. Без since возвращаются последние limit образцов
 @app.route("/display", methods=["GET"])
 def display_telemetry():
-    return jsonify(drone_state["telemetry_data"]), 200
+    drone_id = request.args.get("drone_id", "default")
+    since = request.args.get("since", type=float)
+    limit = min(request.args.get("limit", DISPLAY_MAX_LIMIT, type=int), DISPLAY_MAX_LIMIT)
+    return jsonify(telemetry_store.window(drone_id, since, limit)), 200
 
 
 @app.route("/video", methods=["POST"])
 def receive_video():
-    global video_frame
-    np_array = np.frombuffer(request.data, dtype=np.uint8)
-    video_frame = cv2.imdecode(np_array, cv2.IMREAD_COLOR)
+    try:
+        video_broadcaster.publish_jpeg(request.data)
+    except ValueError as e:
+        return jsonify({"error": f"Некорректный кадр: {e}"}), 400
     return "", 204
 
 
 @app.route("/video_feed")
 def video_feed():
+    # Генератор ждет новую версию кадра и отдает готовые байты, не кодируя кадр заново
     def generate():
-        global video_frame
-        while True:
-            if video_frame is not None:
-                _, buffer = cv2.imencode('.jpg', video_frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
-                frame = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-            time.sleep(1 / fps)
+        for frame in video_broadcaster.frames(max_fps=fps):
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
     return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
@@ -0,0 +1,53 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Наборы PRAGMA для соединений SQLite. Во всех профилях WAL: читатели не блокируются пишущим
+# соединением, а commit пишет только в журнал.
+#   durable     - synchronous=FULL: зафиксированная транзакция переживает отключение питания
+#   ingest      - synchronous=NORMAL: fsync только при checkpoint, при сбое питания теряются
+#                 последние транзакции (база не повреждается); большой кэш страниц для вставок
+#   read-mostly - большой mmap: страницы читаются из общего кэша ОС без копирования в кэш соединения
+# cache_size < 0 - размер в КиБ, mmap_size - в байтах, busy_timeout - в миллисекундах.
+# busy_timeout идет первым, чтобы смена journal_mode подождала чужую блокировку
+SQLITE_PROFILES = {
+    "durable": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "mmap_size": 64 * 1024 * 1024,
+        "cache_size": -16000,
+        "temp_store": "MEMORY",
+    },
+    "ingest": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64000,
+        "temp_store": "MEMORY",
+    },
+    "read-mostly": {
+        "busy_timeout": 10000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 1024 * 1024 * 1024,
+        "cache_size": -32000,
+        "temp_store": "MEMORY",
+    },
+}
+
+
+# Применяет профиль (имя из SQLITE_PROFILES или словарь PRAGMA) к открытому соединению
+def apply_profile(connection, profile):
+    if profile is None:
+        return
+    if isinstance(profile, str):
+        if profile not in SQLITE_PROFILES:
+            raise ValueError(f"Unknown SQLite profile: {profile} (expected one of {', '.join(SQLITE_PROFILES)})")
+        profile = SQLITE_PROFILES[profile]
+    for pragma, value in profile.items():
+        result = connection.execute(f"PRAGMA {pragma} = {value}").fetchone()
+        # Базы в памяти остаются в journal_mode=memory - это не ошибка
+        if pragma == "journal_mode" and result and str(result[0]).upper() not in (str(value).upper(), "MEMORY"):
+            logger.warning(f"SQLite journal_mode is {result[0]} instead of {value}")
@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+
+import msgpack
+import numpy as np
+
+# Колонки образца телеметрии. Порядок байт указан явно: тот же тип разбирает двоичный формат
+# /telemetry/batch - записи по 32 байта, 4 x float64 little-endian (struct "<dddd")
+TELEMETRY_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("latitude", "<f8"),
+    ("longitude", "<f8"),
+    ("altitude", "<f8"),
+])
+
+
+# Кольцевой буфер телеметрии одного дрона фиксированной емкости: при заполнении новые образцы
+# затирают самые старые. Данные лежат в одном массиве NumPy с типизированными колонками,
+# добавление - O(1), выборка окна - двоичный поиск по времени и копия только выбранных строк.
+# Время образцов не должно убывать: на этом держится поиск по since. Образцы без времени
+# (timestamp None или NaN) получают time.time() под блокировкой буфера - иначе параллельные
+# запросы одного дрона могли бы записать время не по порядку
+class TelemetryRingBuffer:
+    def __init__(self, capacity=3000):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=TELEMETRY_DTYPE)
+        self._count = 0  # Всего добавлено образцов, позиция записи - _count % capacity
+        self._lock = threading.Lock()
+
+    def append(self, timestamp, latitude, longitude, altitude):
+        with self._lock:
+            if timestamp is None:
+                timestamp = time.time()
+            if self._count and timestamp < self._data[(self._count - 1) % self.capacity]["timestamp"]:
+                raise ValueError(f"Telemetry sample at {timestamp} is older than the last one")
+            self._data[self._count % self.capacity] = (timestamp, latitude, longitude, altitude)
+            self._count += 1
+
+    def extend(self, samples):
+        # Пакет образцов (массив TELEMETRY_DTYPE) записывается не более чем двумя срезами.
+        # Из пакета больше емкости сохраняются последние capacity образцов
+        samples = samples[-self.capacity:]
+        with self._lock:
+            missing = np.isnan(samples["timestamp"])
+            if missing.any():
+                samples = samples.copy()
+                samples["timestamp"][missing] = time.time()
+            timestamps = samples["timestamp"]
+            if len(samples) > 1 and np.any(timestamps[1:] < timestamps[:-1]):
+                raise ValueError("Telemetry batch is not ordered by timestamp")
+            if len(samples) and self._count and \
+                    samples[0]["timestamp"] < self._data[(self._count - 1) % self.capacity]["timestamp"]:
+                raise ValueError(f"Telemetry sample at {samples[0]['timestamp']} is older than the last one")
+            position = self._count % self.capacity
+            head = min(len(samples), self.capacity - position)
+            self._data[position:position + head] = samples[:head]
+            self._data[:len(samples) - head] = samples[head:]
+            self._count += len(samples)
+
+    def window(self, since=None, limit=None):
+        # Образцы с timestamp > since по возрастанию времени. limit без since - последние limit
+        # образцов, вместе с since - первые limit после since (клиент продолжает со своего последнего)
+        with self._lock:
+            segments = self._segments()
+            if since is not None:
+                segments = [segment[np.searchsorted(segment["timestamp"], since, side="right"):]
+                            for segment in segments]
+            if limit is not None:
+                segments = self._first(segments, limit) if since is not None else self._last(segments, limit)
+            return np.concatenate(segments) if segments else np.zeros(0, dtype=TELEMETRY_DTYPE)
+
+    def latest(self):
+        with self._lock:
+            if not self._count:
+                return None
+            return self._data[(self._count - 1) % self.capacity].copy()
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def _segments(self):
+        # Представления (без копирования) на хранимые образцы в хронологическом порядке
+        if self._count <= self.capacity:
+            return [self._data[:self._count]]
+        start = self._count % self.capacity
+        return [self._data[start:], self._data[:start]]
+
+    @staticmethod
+    def _first(segments, limit):
+        result = []
+        for segment in segments:
+            if limit <= 0:
+                break
+            result.append(segment[:limit])
+            limit -= len(result[-1])
+        return result
+
+    @staticmethod
+    def _last(segments, limit):
+        result = []
+        for segment in reversed(segments):
+            if limit <= 0:
+                break
+            result.insert(0, segment[max(0, len(segment) - limit):])
+            limit -= len(result[0])
+        return result
+
+
+# Буферы телеметрии по дронам. Буфер дрона создается при первом образце
+class TelemetryStore:
+    def __init__(self, capacity=3000):
+        self.capacity = capacity
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def append(self, drone_id, sample):
+        timestamp = sample.get("timestamp")
+        self._buffer(drone_id).append(None if timestamp is None else float(timestamp), float(sample["latitude"]),
+                                      float(sample["longitude"]), float(sample["altitude"]))
+
+    def extend(self, drone_id, samples):
+        self._buffer(drone_id).extend(samples)
+
+    def window(self, drone_id, since=None, limit=None):
+        buffer = self._buffers.get(drone_id)
+        if buffer is None:
+            return []
+        return to_records(buffer.window(since, limit))
+
+    def drone_ids(self):
+        return list(self._buffers)
+
+    def _buffer(self, drone_id):
+        buffer = self._buffers.get(drone_id)
+        if buffer is None:
+            with self._lock:
+                buffer = self._buffers.setdefault(drone_id, TelemetryRingBuffer(self.capacity))
+        return buffer
+
+
+# Разбор тела /telemetry/batch по Content-Type. Результат - словарь {drone_id: массив TELEMETRY_DTYPE}.
+# В двоичном формате id дрона один на весь пакет (default_drone_id), в NDJSON и msgpack
+# у каждого образца может быть свой "drone_id"
+def parse_batch(content_type, body, default_drone_id="default"):
+    content_type = (content_type or "").split(";")[0].strip()
+    if content_type == "application/octet-stream":
+        if len(body) % TELEMETRY_DTYPE.itemsize:
+            raise ValueError(f"Binary telemetry batch of {len(body)} bytes is not a whole number of "
+                             f"{TELEMETRY_DTYPE.itemsize}-byte records")
+        return {default_drone_id: np.frombuffer(body, dtype=TELEMETRY_DTYPE)}
+    if content_type == "application/x-ndjson":
+        records = [json.loads(line) for line in body.splitlines() if line.strip()]
+    elif content_type in ("application/msgpack", "application/x-msgpack"):
+        records = msgpack.unpackb(body)
+    else:
+        raise ValueError(f"Unsupported telemetry batch content type: {content_type}")
+    return from_records(records, default_drone_id)
+
+
+# Образец без "timestamp" получает NaN: время проставит буфер при записи
+def from_records(records, default_drone_id="default"):
+    groups = {}
+    for record in records:
+        groups.setdefault(str(record.get("drone_id", default_drone_id)), []).append(
+            (float(record.get("timestamp", np.nan)), float(record["latitude"]), float(record["longitude"]),
+             float(record["altitude"])))
+    return {drone_id: np.array(rows, dtype=TELEMETRY_DTYPE) for drone_id, rows in groups.items()}
+
+
+def to_records(samples):
+    # Структурированный массив -> список словарей для JSON
+    names = samples.dtype.names
+    return [dict(zip(names, row)) for row in samples.tolist()]
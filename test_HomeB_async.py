@@ -0,0 +1,291 @@
+import asyncio
+
+import pytest
+
+# HomeB_async импортирует драйверы всех СУБД; тесты работают с SQLite и заглушками пулов
+for driver in ("aiomysql", "asyncpg", "mysql.connector", "psycopg2"):
+    pytest.importorskip(driver)
+
+from HomeB import Drone  # noqa: E402
+from HomeB_async import (  # noqa: E402
+    AsyncDroneMapper,
+    AsyncMySQLFactory,
+    AsyncPostgreSQLFactory,
+    AsyncSQLiteFactory,
+    create_tables,
+)
+
+
+def run_with_mapper(tmp_path, scenario, pool_size=4, max_query_params=None):
+    # Каждый тест - своя база SQLite во временном каталоге и свой цикл событий
+    async def main():
+        factory = AsyncSQLiteFactory(str(tmp_path / "drones.db"), pool_size=pool_size)
+        if max_query_params is not None:
+            factory.max_query_params = max_query_params
+        try:
+            await create_tables(factory)
+            return await scenario(AsyncDroneMapper(factory))
+        finally:
+            await factory.close()
+    return asyncio.run(main())
+
+
+def make_drones(count):
+    return [Drone(None, f"Manufacturer {i % 3}", f"Model {i}", f"{1000 + i} mAh") for i in range(count)]
+
+
+def test_concurrent_find_by_id_returns_each_drone(tmp_path):
+    async def scenario(mapper):
+        await mapper.insert_many(make_drones(50))
+        # Запросов больше, чем соединений в пуле: лишние ждут свободного соединения
+        return await asyncio.gather(*(mapper.find_by_id(drone_id) for drone_id in range(1, 61)))
+
+    found = run_with_mapper(tmp_path, scenario, pool_size=2)
+
+    assert [drone.drone_id for drone in found[:50]] == list(range(1, 51))
+    assert found[0].model == "Model 0" and found[49].model == "Model 49"
+    assert found[50:] == [None] * 10
+
+
+def test_find_by_ids_merges_chunks(tmp_path):
+    async def scenario(mapper):
+        await mapper.insert_many(make_drones(30))
+        # 45 уникальных id порциями по 7 - семь параллельных запросов
+        return await mapper.find_by_ids(list(range(1, 46)) + [3, 3, 17])
+
+    found = run_with_mapper(tmp_path, scenario, max_query_params=7)
+
+    assert sorted(found) == list(range(1, 31))
+    assert all(drone.drone_id == drone_id for drone_id, drone in found.items())
+
+
+def test_insert_many_counts_duplicates(tmp_path):
+    first, second, third = make_drones(3)
+
+    async def scenario(mapper):
+        # Дубликат внутри пакета и дубликат уже сохраненной строки считаются пропущенными
+        initial = await mapper.insert_many([first, second, first])
+        repeated = await mapper.insert_many([second, third])
+        found = await mapper.find_by_ids(range(1, 10))
+        return initial, repeated, found
+
+    initial, repeated, found = run_with_mapper(tmp_path, scenario)
+
+    assert initial == {"inserted": 2, "skipped": 1}
+    assert repeated == {"inserted": 1, "skipped": 1}
+    assert sorted(drone.model for drone in found.values()) == ["Model 0", "Model 1", "Model 2"]
+
+
+# Заглушки пулов и соединений asyncpg/aiomysql: записывают SQL, параметры и управление транзакцией.
+# Подставляются в factory._pool, поэтому сервер СУБД для этих тестов не нужен
+class FakeTransaction:
+    def __init__(self, log):
+        self.log = log
+
+    async def start(self):
+        self.log.append("BEGIN")
+
+    async def commit(self):
+        self.log.append("COMMIT")
+
+    async def rollback(self):
+        self.log.append("ROLLBACK")
+
+
+class FakeAsyncpgConnection:
+    def __init__(self, status="SELECT 0"):
+        self.log = []
+        self.status = status
+        self.terminated = False
+
+    def transaction(self):
+        return FakeTransaction(self.log)
+
+    async def fetch(self, query, *params):
+        self.log.append((query, params))
+        return []
+
+    async def execute(self, query, *params):
+        self.log.append((query, params))
+        return self.status
+
+    async def executemany(self, query, rows):
+        self.log.append((query, rows))
+
+    def terminate(self):
+        self.terminated = True
+
+
+class FakeAsyncpgPool:
+    def __init__(self, connection):
+        self.connection = connection
+        self.released = []
+
+    async def acquire(self):
+        return self.connection
+
+    async def release(self, connection):
+        self.released.append(connection)
+
+
+class FakeAiomysqlCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = connection.rowcount
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    async def execute(self, query, params=None):
+        self.connection.log.append((query, params))
+
+    async def executemany(self, query, rows):
+        self.connection.log.append((query, rows))
+
+    async def fetchall(self):
+        return []
+
+
+class FakeAiomysqlConnection:
+    def __init__(self, rowcount=0):
+        self.log = []
+        self.rowcount = rowcount
+        self.closed = False
+
+    def cursor(self, cursor_class=None):
+        return FakeAiomysqlCursor(self)
+
+    async def commit(self):
+        self.log.append("COMMIT")
+
+    async def rollback(self):
+        self.log.append("ROLLBACK")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAiomysqlPool:
+    def __init__(self, connection):
+        self.connection = connection
+        self.released = []
+
+    async def acquire(self):
+        return self.connection
+
+    def release(self, connection):
+        self.released.append(connection)
+
+
+def postgresql_factory(connection):
+    factory = AsyncPostgreSQLFactory()
+    factory._pool = FakeAsyncpgPool(connection)
+    return factory
+
+
+def mysql_factory(connection):
+    factory = AsyncMySQLFactory()
+    factory._pool = FakeAiomysqlPool(connection)
+    return factory
+
+
+def test_postgresql_translates_placeholders_and_literal_percent():
+    connection = FakeAsyncpgConnection()
+    factory = postgresql_factory(connection)
+    query_builder = factory.create_query_builder()
+    query = query_builder.select("drones", ["id"]) \
+        .where("model LIKE 'M%' AND id = ?", 5) \
+        .where("battery_capacity = ?", "5000 mAh") \
+        .get_query()
+
+    async def scenario():
+        acquired = await factory.acquire()
+        await factory.fetch(acquired, query, query_builder.get_params())
+        await factory.fetch(acquired, query, query_builder.get_params())  # Второй раз - из кэша перевода
+        await factory.execute_many(acquired, "INSERT INTO drones (model) VALUES (%s)", [("a",), ("b",)])
+
+    asyncio.run(scenario())
+
+    expected = "SELECT id FROM drones WHERE model LIKE 'M%' AND id = $1 AND battery_capacity = $2"
+    assert connection.log[1:] == [
+        (expected, (5, "5000 mAh")),
+        (expected, (5, "5000 mAh")),
+        ("INSERT INTO drones (model) VALUES ($1)", [("a",), ("b",)]),
+    ]
+
+
+@pytest.mark.parametrize("status, rowcount", [("INSERT 0 5", 5), ("UPDATE 3", 3), ("DELETE 0", 0),
+                                              ("CREATE TABLE", -1)])
+def test_postgresql_execute_parses_status(status, rowcount):
+    factory = postgresql_factory(FakeAsyncpgConnection(status))
+
+    async def scenario():
+        connection = await factory.acquire()
+        return await factory.execute(connection, "SELECT 1")
+
+    assert asyncio.run(scenario()) == rowcount
+
+
+def test_postgresql_transaction_per_connection():
+    connection = FakeAsyncpgConnection()
+    factory = postgresql_factory(connection)
+
+    async def scenario():
+        # Зафиксированная транзакция при возврате в пул не откатывается
+        committed = await factory.acquire()
+        await factory.commit(committed)
+        await factory.release(committed)
+        # Незавершенная - откатывается при возврате
+        await factory.release(await factory.acquire())
+        # Сброшенное соединение закрывается без отката
+        await factory.release(await factory.acquire(), discard=True)
+
+    asyncio.run(scenario())
+
+    assert connection.log == ["BEGIN", "COMMIT", "BEGIN", "ROLLBACK", "BEGIN"]
+    assert connection.terminated
+    assert factory._pool.released == [connection] * 3
+    assert factory._transactions == {}
+
+
+def test_mysql_doubles_percent_only_with_params():
+    connection = FakeAiomysqlConnection()
+    factory = mysql_factory(connection)
+    query_builder = factory.create_query_builder()
+    query = query_builder.select("drones", ["id"]).where("model LIKE 'M%' AND id = ?", 5).get_query()
+
+    async def scenario():
+        acquired = await factory.acquire()
+        await factory.fetch(acquired, query, query_builder.get_params())
+        await factory.fetch(acquired, "SELECT id FROM drones WHERE model LIKE 'M%'")
+        await factory.execute_many(acquired, "INSERT INTO drones (model) VALUES (%s)", [("a",), ("b",)])
+
+    asyncio.run(scenario())
+
+    assert connection.log == [
+        ("SELECT id FROM drones WHERE model LIKE 'M%%' AND id = %s", [5]),
+        ("SELECT id FROM drones WHERE model LIKE 'M%'", None),
+        ("INSERT INTO drones (model) VALUES (%s)", [("a",), ("b",)]),
+    ]
+
+
+def test_mysql_execute_commit_and_release():
+    connection = FakeAiomysqlConnection(rowcount=4)
+    factory = mysql_factory(connection)
+
+    async def scenario():
+        acquired = await factory.acquire()
+        rowcount = await factory.execute(acquired, "DELETE FROM drones WHERE id IN (%s, %s)", [1, 2])
+        await factory.commit(acquired)
+        await factory.rollback(acquired)
+        await factory.release(acquired)
+        await factory.release(await factory.acquire(), discard=True)
+        return rowcount
+
+    assert asyncio.run(scenario()) == 4
+    assert connection.log[1:] == ["COMMIT", "ROLLBACK"]
+    assert connection.closed
+    assert factory._pool.released == [connection, connection]
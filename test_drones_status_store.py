@@ -0,0 +1,57 @@
+import datetime
+import os
+import sqlite3
+
+import pytest
+
+# drones_status_store импортирует psycopg2 для PostgreSQLStatusStore, тесты работают только с SQLite
+pytest.importorskip("psycopg2")
+
+from drones_status_store import SQLiteStatusStore  # noqa: E402
+
+DAY = datetime.date(2024, 1, 2)
+
+
+def status(time):
+    return (1, 1, 1, 1, f"{DAY.isoformat()} {time}", 90, 55.75, 37.61, 120.0, 90.0, True)
+
+
+def test_detached_day_rejects_appends_and_keeps_detached_rows(tmp_path):
+    store = SQLiteStatusStore(str(tmp_path / "store"))
+    store.append_batch([status("10:00:00")])
+    detached = store.detach_partition(DAY)
+
+    with pytest.raises(ValueError):
+        store.append_batch([status("11:00:00")])
+    with pytest.raises(FileNotFoundError):
+        store.detach_partition(DAY)  # Живого файла дня нет - отключать нечего
+
+    assert store.partitions() == []
+    assert store.query_range(DAY, DAY + datetime.timedelta(days=1)) == []
+    store.close()
+    connection = sqlite3.connect(detached)
+    times = [row[0] for row in connection.execute("SELECT status_update_time FROM tbl_drones_status")]
+    connection.close()
+    assert times == [f"{DAY.isoformat()} 10:00:00"]
+
+
+def test_detach_and_archive_do_not_overwrite_existing_files(tmp_path):
+    store = SQLiteStatusStore(str(tmp_path / "store"))
+    store.append_batch([status("10:00:00")])
+    detached = store.detach_partition(DAY)
+    # Живой файл дня, появившийся в обход хранилища (например, скопированный вручную)
+    with open(store.partition_path(DAY), "wb") as stray:
+        stray.write(b"")
+
+    with pytest.raises(FileExistsError):
+        store.detach_partition(DAY)
+    archive = tmp_path / "archive"
+    os.makedirs(archive)
+    with open(archive / os.path.basename(detached), "wb") as existing:
+        existing.write(b"archived earlier")
+    with pytest.raises(FileExistsError):
+        store.archive_partition(DAY, str(archive))
+
+    assert os.path.getsize(detached) > 0
+    assert (archive / os.path.basename(detached)).read_bytes() == b"archived earlier"
+    store.close()
@@ -0,0 +1,69 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+# Последний кадр видео для всех зрителей /video_feed. Кадр кодируется в JPEG один раз при
+# публикации и хранится готовыми байтами с номером версии; генераторы зрителей ждут на
+# Condition появления версии новее своей и отдают те же байты. Стоимость - O(кадров),
+# а не O(кадров x зрителей), и повторно один и тот же кадр никому не отправляется
+class FrameBroadcaster:
+    def __init__(self, quality=80):
+        self.quality = quality
+        self._condition = threading.Condition()
+        self._frame = None
+        self._version = 0
+        self.viewers = 0
+
+    def publish_jpeg(self, jpeg):
+        # Принятый JPEG декодируется (проверка, что это изображение) и перекодируется с quality -
+        # единственное кодирование кадра на сервере
+        image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Video frame is not a decodable image")
+        return self.publish(image)
+
+    def publish(self, image):
+        _, buffer = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+        frame = buffer.tobytes()
+        with self._condition:
+            self._version += 1
+            self._frame = frame
+            self._condition.notify_all()
+            return self._version
+
+    def wait(self, after_version, timeout=None):
+        # (версия, JPEG) кадра новее after_version; по таймауту - (after_version, None)
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._version > after_version, timeout):
+                return after_version, None
+            return self._version, self._frame
+
+    def latest(self):
+        with self._condition:
+            return self._version, self._frame
+
+    def frames(self, max_fps=None, timeout=1.0):
+        # Поток новых кадров для одного зрителя. max_fps ограничивает частоту отдачи:
+        # промежуточные версии пропускаются, зритель всегда получает самый свежий кадр
+        period = 1 / max_fps if max_fps else 0.0
+        version = 0
+        with self._condition:
+            self.viewers += 1
+        try:
+            last_sent = None
+            while True:
+                if last_sent is not None and period:
+                    delay = last_sent + period - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                version, frame = self.wait(version, timeout)
+                if frame is None:
+                    continue
+                last_sent = time.monotonic()
+                yield frame
+        finally:
+            with self._condition:
+                self.viewers -= 1